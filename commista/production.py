@@ -1,3 +1,5 @@
+from decouple import Csv
+
 from .settings import *
 
 CLOUDINARY_STORAGE = {
@@ -14,6 +16,31 @@ DATABASES = {
     )
 }
 
+# Comma separated URLs of the read replicas of DATABASE_URL
+for index, url in enumerate(config("DATABASE_REPLICA_URLS", default="", cast=Csv())):
+    DATABASES[f"replica_{index}"] = dj_database_url.parse(url, conn_max_age=600, conn_health_checks=True)
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != "default"]
+
+DATABASE_ROUTERS = ["common.routers.ReplicaRouter"] if DATABASE_REPLICAS else []
+
+# Shared by all the workers, cached feeds are rendered once per change instead of once per process
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": config("CACHE_LOCATION", default="/var/tmp/commista_cache"),
+    },
+    # In the database every host reads, carts are only culled once expired or past CART_CACHE_MAX_ENTRIES
+    "carts": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "store_cart_cache",
+        "OPTIONS": {
+            "MAX_ENTRIES": config("CART_CACHE_MAX_ENTRIES", default=1_000_000, cast=int),
+            "CULL_FREQUENCY": 10,
+        },
+    },
+}
+
 INSTALLED_APPS.remove("debug_toolbar")
 
 EMAIL_USE_TLS = True
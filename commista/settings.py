@@ -13,7 +13,7 @@ from datetime import timedelta
 from pathlib import Path
 
 import dj_database_url
-from decouple import config
+from decouple import Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -67,6 +67,15 @@ REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "rest_framework_simplejwt.authentication.JWTAuthentication",
     ),
+    "DEFAULT_RENDERER_CLASSES": (
+        "common.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+    "DEFAULT_PARSER_CLASSES": (
+        "common.parsers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ),
     "DEFAULT_FILTER_BACKENDS": (
         "django_filters.rest_framework.DjangoFilterBackend",
         "rest_framework.filters.OrderingFilter",
@@ -81,7 +90,8 @@ REST_FRAMEWORK = {
         'category': '30/minute',
         'payment': '15/minute',
         'email': '20/minute',
-        'password': '20/minute'
+        'password': '20/minute',
+        'catalog_export': '5/minute'
     },
     "COERCE_DECIMAL_TO_STRING": False,
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
@@ -134,6 +144,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "common.middleware.ReplicaReadMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -165,7 +176,32 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3"
-    }
+    },
+}
+
+# Comma separated URLs of the read replicas of the default database, none by default
+for index, url in enumerate(config("DATABASE_REPLICA_URLS", default="", cast=Csv())):
+    DATABASES[f"replica_{index}"] = dj_database_url.parse(url)
+
+# Aliases the catalog reads are spread over, see common.routers. Empty, the default database serves everything.
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != "default"]
+
+DATABASE_ROUTERS = ["common.routers.ReplicaRouter"] if DATABASE_REPLICAS else []
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "commista",
+    },
+    # Carts live only in this cache until checkout, kept apart so throttles, feeds and facets never cull them
+    "carts": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "commista-carts",
+        "OPTIONS": {"MAX_ENTRIES": 100_000, "CULL_FREQUENCY": 10},
+    },
 }
 
 # Password validation
@@ -219,6 +255,13 @@ MEDIA_URL = "media/"
 
 MEDIA_ROOT = BASE_DIR / "static/media"
 
+# Bounding boxes of the resized variants generated for every uploaded image, see common.images
+IMAGE_DERIVATIVE_SIZES = {
+    "thumbnail": (150, 150),
+    "medium": (600, 600),
+    "large": (1200, 1200),
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
@@ -372,6 +415,31 @@ DEFAULT_PRODUCT_SHIPPING_DAYS = config("DEFAULT_PRODUCT_SHIPPING_DAYS")
 # Default product shipping fee for all products
 DEFAULT_PRODUCT_SHIPPING_FEE = config("DEFAULT_PRODUCT_SHIPPING_FEE")
 
+# Upper bound in seconds for the cached home feed, entries also expire at the next flash sale start or end
+HOME_FEED_CACHE_TIMEOUT = 60 * 15
+
+# Seconds the serialized related products of a category are kept, changes to the category drop them earlier
+RELATED_PRODUCTS_CACHE_TIMEOUT = 60 * 60
+
+# Seconds the grouped categories are kept, saving or deleting a category drops them earlier
+CATEGORY_TAXONOMY_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Seconds the facet counts of a product filter query are kept, catalog changes drop them earlier
+PRODUCT_FACETS_CACHE_TIMEOUT = 60 * 15
+
+# Upper bounds of the price ranges counted by the product facets, the last range is open ended
+PRODUCT_FACET_PRICE_BUCKETS = (25, 50, 100, 200, 500)
+
+# Where carts are kept until checkout creates their order, see store.carts
+CART_BACKEND = "store.carts.CacheCartBackend"
+
+# Cache alias and seconds a cart is kept by the cache cart backend, every change restarts the timeout
+CART_CACHE_ALIAS = "carts"
+CART_CACHE_TIMEOUT = 60 * 60 * 24 * 30
+
+# Most operations a single request to the batch cart endpoint may apply
+CART_BATCH_MAX_OPERATIONS = 100
+
 # Flutterwave variables
 FW_KEY = config("FLUTTERWAVE_SECRET_KEY")
 
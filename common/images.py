@@ -0,0 +1,93 @@
+import os
+import threading
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import Signal
+from PIL import Image, ImageOps
+
+# Models with resized variants, mapped to their image field. The URLs are stored in their `image_urls` field.
+IMAGE_MODELS = {}
+
+# Sent once the variant URLs of an image are stored, the queryset update bypasses post_save
+image_urls_updated = Signal()
+
+
+def generate_image_derivatives(instance, field_name):
+    """
+    Writes the resized variants next to the original image and returns the URLs of all of them.
+    """
+    file = getattr(instance, field_name)
+    storage = file.storage
+    root, _ = os.path.splitext(file.name)
+    urls = {"original": storage.url(file.name)}
+
+    file.open("rb")
+    try:
+        with Image.open(file) as original:
+            original = ImageOps.exif_transpose(original)
+            image_format, extension = ("PNG", ".png") if original.mode in ("RGBA", "LA", "P") else ("JPEG", ".jpg")
+            for variant, size in settings.IMAGE_DERIVATIVE_SIZES.items():
+                image = original.copy()
+                image.thumbnail(size)
+                if image_format == "JPEG" and image.mode != "RGB":
+                    image = image.convert("RGB")
+                buffer = BytesIO()
+                image.save(buffer, image_format, quality=85, optimize=True)
+                name = storage.save(f"{root}_{variant}{extension}", ContentFile(buffer.getvalue()))
+                urls[variant] = storage.url(name)
+    finally:
+        file.close()
+    return urls
+
+
+def update_image_urls(model, pk, using="default"):
+    field_name = IMAGE_MODELS[model]
+    instance = model._base_manager.using(using).filter(pk=pk).first()
+    if instance is None or not getattr(instance, field_name):
+        return
+    urls = generate_image_derivatives(instance, field_name)
+    # Skipped when the image was replaced in the meantime, the run for the new one stores its URLs
+    with transaction.atomic(using=using):
+        updated = model._base_manager.using(using) \
+            .filter(pk=pk, **{field_name: getattr(instance, field_name).name}) \
+            .update(image_urls=urls)
+        if updated:
+            instance.image_urls = urls
+            image_urls_updated.send(sender=model, instance=instance, using=using)
+
+
+def _update_image_urls_in_background(model, pk, using):
+    try:
+        update_image_urls(model, pk, using)
+    finally:
+        # The thread opened its own connections
+        connections.close_all()
+
+
+def register_image_derivatives(model, field_name):
+    """
+    Generates the variants of every image uploaded to `field_name` of `model` in a background thread.
+    """
+    IMAGE_MODELS[model] = field_name
+
+    def handle_image_upload(sender, instance, **kwargs):
+        # Uploaded files are only committed to the storage while the instance is saved
+        file = getattr(instance, field_name)
+        instance._image_uploaded = bool(file) and not file._committed
+
+    def handle_image_derivatives(sender, instance, using, **kwargs):
+        if not getattr(instance, "_image_uploaded", False):
+            return
+        # The original is served right away, the variants are added once generated
+        instance.image_urls = {"original": getattr(instance, field_name).url}
+        model._base_manager.using(using).filter(pk=instance.pk).update(image_urls=instance.image_urls)
+        t = threading.Thread(target=_update_image_urls_in_background, args=(model, instance.pk, using))
+        transaction.on_commit(t.start, using=using)
+
+    dispatch_uid = f"{model._meta.label_lower}.image_derivatives"
+    pre_save.connect(handle_image_upload, sender=model, weak=False, dispatch_uid=dispatch_uid)
+    post_save.connect(handle_image_derivatives, sender=model, weak=False, dispatch_uid=dispatch_uid)
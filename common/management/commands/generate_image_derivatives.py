@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from common.images import IMAGE_MODELS, update_image_urls
+
+
+class Command(BaseCommand):
+    help = 'Generates the resized variants of the images that do not have them yet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Regenerate the variants of every image.')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database to read the images from.')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        for model, field_name in IMAGE_MODELS.items():
+            queryset = model._base_manager.using(using).exclude(**{field_name: ''})
+            if not options['all']:
+                # Only the original is stored until the variants are generated
+                queryset = queryset.filter(image_urls__thumbnail__isnull=True)
+            processed = 0
+            for pk in queryset.values_list('pk', flat=True):
+                try:
+                    update_image_urls(model, pk, using)
+                except OSError as error:
+                    # A missing or broken file should not stop the rest of the backfill
+                    self.stderr.write(f'{model._meta.verbose_name} {pk} skipped: {error}')
+                    continue
+                processed += 1
+            self.stdout.write(self.style.SUCCESS(f'{processed} {model._meta.verbose_name_plural} processed.'))
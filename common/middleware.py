@@ -0,0 +1,26 @@
+from common.routers import allow_replica_reads, reset_replica_reads
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class ReplicaReadMiddleware:
+    """
+    Lets safe requests to views with `read_from_replica = True` read from the replicas, see `ReplicaRouter`.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # Every request starts on the primary, whatever the previous request on this worker did
+        token = allow_replica_reads(False)
+        try:
+            return self.get_response(request)
+        finally:
+            reset_replica_reads(token)
+
+    @staticmethod
+    def process_view(request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, "cls", None) or getattr(view_func, "view_class", None)
+        if request.method in SAFE_METHODS and getattr(view_class, "read_from_replica", False):
+            allow_replica_reads()
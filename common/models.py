@@ -1,13 +1,13 @@
-from uuid import uuid4
-
 from django.db import models
 
+from common.uuids import uuid7
+
 
 # Create your models here.
 
 
 class BaseModel(models.Model):
-    id = models.UUIDField(primary_key=True, default=uuid4, editable=False, unique=True)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False, unique=True)
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True, null=True)
 
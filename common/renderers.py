@@ -0,0 +1,38 @@
+from decimal import Decimal
+
+import orjson
+from django_countries.fields import Country
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+_encoder = JSONEncoder()
+
+
+def _default(obj):
+    # Floats are written in their shortest repr by both libraries, so prices render to the same bytes
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, Country):
+        return obj.code
+    return _encoder.default(obj)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSON renderer backed by orjson, the output is byte-compatible with DRF's compact `JSONRenderer`.
+    """
+    # Datetimes go through DRF's encoder, which cuts them to milliseconds where orjson keeps the microseconds
+    options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        renderer_context = renderer_context or {}
+        if self.ensure_ascii or not self.compact or self.get_indent(accepted_media_type, renderer_context):
+            # Escaped or pretty printed output, e.g. inside the browsable API, is left to DRF
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(data, default=_default, option=self.options)
+        # Same escaping of the JavaScript line terminators as the DRF renderer
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
@@ -0,0 +1,27 @@
+import json
+
+from rest_framework.response import Response
+
+
+class PreRenderedResponse(Response):
+    """
+    A response whose JSON body was rendered ahead of time, e.g. kept in the cache as bytes.
+    """
+
+    def __init__(self, content, status=None, headers=None):
+        super().__init__(status=status, headers=headers, content_type="application/json")
+        self.prerendered_content = content
+
+    @property
+    def rendered_content(self):
+        self["Content-Type"] = self.content_type
+        return self.prerendered_content
+
+    @property
+    def data(self):
+        # Only decoded for callers inspecting response.data, such as the test client
+        return json.loads(self.prerendered_content)
+
+    @data.setter
+    def data(self, value):
+        pass
@@ -0,0 +1,53 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Replica the reads of the current request go to, None once it wrote or when it may not read from a replica
+_replica_alias = ContextVar("replica_alias", default=None)
+
+
+def allow_replica_reads(allowed=True):
+    """
+    Picks the replica of the current request, once so all its reads see the same replication lag.
+    """
+    alias = random.choice(settings.DATABASE_REPLICAS) if allowed and settings.DATABASE_REPLICAS else None
+    return _replica_alias.set(alias)
+
+
+def reset_replica_reads(token):
+    _replica_alias.reset(token)
+
+
+def _in_transaction(using):
+    return connections[using].in_atomic_block
+
+
+class ReplicaRouter:
+    """
+    Sends the reads of requests flagged by `ReplicaReadMiddleware` to one of `DATABASE_REPLICAS`.
+
+    Everything else uses the default database: writes, reads outside those requests (commands, background
+    threads), reads inside a transaction and all the reads of a request once it wrote, so it sees its own writes.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = _replica_alias.get()
+        if alias is None or _in_transaction(DEFAULT_DB_ALIAS):
+            # e.g. select_for_update(), which a replica cannot serve
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        # Pins the rest of the request to the primary
+        _replica_alias.set(None)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary
+        return db == DEFAULT_DB_ALIAS
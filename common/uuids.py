@@ -0,0 +1,24 @@
+import os
+import threading
+import time
+import uuid
+
+_lock = threading.Lock()
+_last_timestamp = 0
+
+
+def uuid7():
+    """
+    Time-ordered UUID (version 7 of RFC 9562) for primary keys, new rows land at the end of the index.
+
+    The first 48 bits are the Unix time in milliseconds and the next 12 bits the fraction of the millisecond,
+    the rest is random. Within a process the ids are strictly increasing, even for ids generated in the same
+    fraction of a millisecond or when the clock goes back.
+    """
+    global _last_timestamp
+    nanoseconds = time.time_ns()
+    timestamp = (nanoseconds // 1_000_000) << 12 | (nanoseconds % 1_000_000) * 4096 // 1_000_000
+    with _lock:
+        timestamp = _last_timestamp = max(timestamp, _last_timestamp + 1)
+    random_bits = int.from_bytes(os.urandom(8), "big") & (1 << 62) - 1
+    return uuid.UUID(int=(timestamp >> 12) << 80 | 7 << 76 | (timestamp & 0xFFF) << 64 | 0b10 << 62 | random_bits)
@@ -0,0 +1,17 @@
+# Generated by Django 4.1.9 on 2026-10-17 07:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0015_alter_otp_expiry_date"),
+    ]
+
+    operations = [
+        migrations.AddField(
+                model_name="profile",
+                name="image_urls",
+                field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
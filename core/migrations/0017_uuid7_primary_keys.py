@@ -0,0 +1,34 @@
+# Generated by Django 4.1.9 on 2026-10-17 07:46
+
+import common.uuids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0016_image_urls"),
+    ]
+
+    operations = [
+        # The default is only used in Python, the columns themselves do not change
+        migrations.SeparateDatabaseAndState(
+                state_operations=[
+                        migrations.AlterField(
+                                model_name="otp",
+                                name="id",
+                                field=models.UUIDField(
+                                        default=common.uuids.uuid7, editable=False, primary_key=True, serialize=False,
+                                        unique=True
+                                ),
+                        ),
+                        migrations.AlterField(
+                                model_name="profile",
+                                name="id",
+                                field=models.UUIDField(
+                                        default=common.uuids.uuid7, editable=False, primary_key=True, serialize=False,
+                                        unique=True
+                                ),
+                        ),
+                ],
+        ),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 4.1.9 on 2026-10-17 07:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0017_uuid7_primary_keys"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+                model_name="otp",
+                index=models.Index(fields=["user", "-created"], name="core_otp_user_idx"),
+        ),
+    ]
@@ -61,6 +61,12 @@ class Otp(BaseModel):
     expiry_date = models.DateTimeField(null=True, editable=False,
                                        help_text=_("The date and time when the OTP will expire."))
 
+    class Meta(BaseModel.Meta):
+        indexes = [
+            # `user.otp.first()` reads the latest code
+            models.Index(fields=["user", "-created"], name="core_otp_user_idx"),
+        ]
+
     def __str__(self):
         return f"{self.user.full_name} ----- {self.code}"
 
@@ -73,6 +79,8 @@ class Profile(BaseModel):
     phone_number = models.CharField(max_length=20, validators=[validate_phone_number],
                                     help_text=_("The phone number of the user."))
     _avatar = models.ImageField(upload_to=upload_path, help_text=_("The avatar image of the user."))
+    # URLs of the original and its resized variants, filled in by common.images
+    image_urls = models.JSONField(default=dict, blank=True, editable=False)
 
     class Meta:
         verbose_name = "Profile"
@@ -83,6 +91,8 @@ class Profile(BaseModel):
 
     @property
     def avatar(self):
+        if self.image_urls:
+            return self.image_urls["original"]
         if self._avatar is not None:
             return self._avatar.url
         return None
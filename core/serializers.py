@@ -69,6 +69,7 @@ class ProfileSerializer(serializers.Serializer):
     birthday = serializers.DateField()
     phone_number = serializers.CharField(max_length=20)
     _avatar = serializers.ImageField(validators=[FileExtensionValidator(['jpg', 'jpeg', 'png'])])
+    avatar_urls = serializers.SerializerMethodField()
 
     def validate__avatar(self, attrs):
         avatar = attrs.get('_avatar')
@@ -77,6 +78,11 @@ class ProfileSerializer(serializers.Serializer):
             raise ValidationError({"message": f"Image {avatar} size should be less than 5MB", "status": "failed"})
         return attrs
 
+    @staticmethod
+    def get_avatar_urls(obj):
+        # Original, thumbnail, medium and large URLs of the avatar
+        return obj.image_urls
+
     def validate_phone_number(self, value):
         phone_number = value
         if not phone_number.startswith('+'):
@@ -2,10 +2,13 @@ from django.contrib.auth import get_user_model
 from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
+from common.images import register_image_derivatives
 from core.models import Profile
 
 User = get_user_model()
 
+register_image_derivatives(Profile, "_avatar")
+
 
 @receiver(post_save, sender=User)
 def handle_profile_creation(sender, instance, created, **kwargs):
@@ -3,10 +3,14 @@ from urllib.parse import urlencode
 from django.contrib import admin, messages
 from django.db.models import Count
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.html import format_html, mark_safe
 
+from store.facets import invalidate_product_facets
+from store.feeds import invalidate_home_feed
 from store.forms import ProductAdminForm
 from store.models import *
+from store.related import rebuild_related_products
 
 
 @admin.register(Category)
@@ -87,7 +91,10 @@ class ProductAdmin(admin.ModelAdmin):
 
     @admin.action(description="Clear inventory")
     def clear_inventory(self, request, queryset):
-        updated_count = queryset.update(inventory=0)
+        updated_count = queryset.update(inventory=0, updated=timezone.now())
+        invalidate_home_feed()
+        invalidate_product_facets()
+        rebuild_related_products(queryset.values_list("category_id", flat=True).distinct())
         self.message_user(
                 request,
                 f"{updated_count} products were successfully updated.",
@@ -0,0 +1,27 @@
+import time
+
+from django.core.cache import cache
+
+VERSION_KEY = "store:{namespace}:version"
+
+
+def get_cache_version(namespace):
+    key = VERSION_KEY.format(namespace=namespace)
+    version = cache.get(key)
+    if version is None:
+        # A missing version (never set or evicted) must not bring back entries cached under an older one
+        version = time.time_ns()
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_cache_version(namespace):
+    try:
+        return cache.incr(VERSION_KEY.format(namespace=namespace))
+    except ValueError:
+        return get_cache_version(namespace)
+
+
+def versioned_cache_key(namespace, *parts):
+    return ":".join(["store", namespace, str(get_cache_version(namespace)), *map(str, parts)])
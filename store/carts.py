@@ -0,0 +1,475 @@
+import time
+import uuid
+from collections import namedtuple
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import ValidationError
+
+from common.uuids import uuid7
+from store.models import ColourInventory, CouponCode, Order, OrderItem, Product, SizeInventory
+
+# What a cart keeps of each line, the prices are the ones the line was added with
+LINE_FIELDS = ("product_id", "size", "colour", "quantity", "extra_price", *OrderItem.price_fields, "line_total")
+
+
+def _failed(message):
+    return ValidationError({"message": message, "status": "failed"})
+
+
+class CartOperationError(ValidationError):
+    """
+    A failed operation of a cart batch, `operation` is its index in the batch.
+    """
+
+    def __init__(self, message, operation):
+        super().__init__({"message": message, "status": "failed"})
+        self.operation = operation
+
+
+def parse_cart_id(cart_id):
+    try:
+        return uuid.UUID(str(cart_id)) if cart_id else None
+    except ValueError:
+        raise _failed("Invalid cart ID. Please check the provided ID.")
+
+
+class Cart:
+    """
+    A customer's cart as the cart backend keeps it, checkout turns it into an order.
+
+    Lines are keyed by product, size and colour.
+    """
+
+    def __init__(self, id, customer_id, lines=()):
+        self.id = id
+        self.customer_id = customer_id
+        self.lines = {self.line_key(line["product_id"], line["size"], line["colour"]): line for line in lines}
+
+    @staticmethod
+    def line_key(product_id, size, colour):
+        return str(product_id), size or "", colour or ""
+
+    def belongs_to(self, customer):
+        return str(self.customer_id) == str(customer.pk)
+
+    def get_product_line(self, product_id):
+        # First line of the product whatever its size and colour
+        return next((line for line in self.lines.values() if line["product_id"] == str(product_id)), None)
+
+    def set_line(self, item):
+        line = {name: getattr(item, name) for name in LINE_FIELDS}
+        line["product_id"] = str(item.product_id)
+        self.lines[self.line_key(item.product_id, item.size, item.colour)] = line
+
+    def remove_line(self, product_id, size, colour):
+        self.lines.pop(self.line_key(product_id, size, colour), None)
+
+    def product_ids(self):
+        return {line["product_id"] for line in self.lines.values()}
+
+    def to_order_items(self, products):
+        """
+        Unsaved order items of the lines whose product is in `products`, a map of the products by ID.
+        """
+        items = []
+        for line in self.lines.values():
+            product = products.get(uuid.UUID(line["product_id"]))
+            if product is not None:
+                items.append(OrderItem(
+                        order_id=self.id, customer_id=self.customer_id, product=product,
+                        **{name: value for name, value in line.items() if name != "product_id"},
+                ))
+        return items
+
+    def unavailable_product_ids(self, items):
+        # Products of the lines `to_order_items` left out, sold out or removed since, which checkout refuses
+        return sorted(self.product_ids() - {str(item.product_id) for item in items})
+
+
+class BaseCartBackend:
+    """
+    Keeps the carts until checkout, the `CART_BACKEND` setting names the one in use.
+    """
+
+    def get(self, cart_id):
+        raise NotImplementedError
+
+    def get_latest(self, customer):
+        raise NotImplementedError
+
+    def save(self, cart):
+        raise NotImplementedError
+
+    def delete(self, cart):
+        """
+        Drops the cart and returns whether it was still there, so concurrent checkouts order it once.
+        """
+        raise NotImplementedError
+
+    def update(self, cart):
+        # Removing the last line removes the cart too
+        if cart.lines:
+            self.save(cart)
+        else:
+            self.delete(cart)
+
+    @contextmanager
+    def lock(self, cart_id):
+        """
+        Held while a cart is read, changed and written back, so concurrent changes to it are applied one after the
+        other instead of overwriting each other.
+        """
+        yield
+
+    def refresh(self, cart):
+        # The cart as stored now, or an empty one with its ID once it was dropped
+        return self.get(cart.id) or Cart(cart.id, cart.customer_id)
+
+
+class CacheCartBackend(BaseCartBackend):
+    """
+    Keeps carts in the `CART_CACHE_ALIAS` cache, local memory in development and tests and the database in production.
+
+    Carts that are never checked out expire after `CART_CACHE_TIMEOUT` seconds without any database write. Locks
+    are cache keys added next to the carts, a lock whose holder died expires after `lock_timeout` seconds.
+    """
+    key_prefix = "cart"
+    lock_timeout = 10
+    lock_wait = 5
+    lock_retry_delay = 0.05
+
+    def __init__(self, alias=None, timeout=None):
+        self.cache = caches[alias or settings.CART_CACHE_ALIAS]
+        self.timeout = settings.CART_CACHE_TIMEOUT if timeout is None else timeout
+
+    def cart_key(self, cart_id):
+        return f"{self.key_prefix}:{cart_id}"
+
+    def latest_key(self, customer_id):
+        return f"{self.key_prefix}:customer:{customer_id}"
+
+    def get(self, cart_id):
+        data = self.cache.get(self.cart_key(cart_id))
+        if data is None:
+            return None
+        return Cart(cart_id, data["customer_id"], data["lines"])
+
+    def get_latest(self, customer):
+        cart_id = self.cache.get(self.latest_key(customer.pk))
+        return None if cart_id is None else self.get(cart_id)
+
+    def save(self, cart):
+        self.cache.set_many({
+            self.cart_key(cart.id): {"customer_id": str(cart.customer_id), "lines": list(cart.lines.values())},
+            self.latest_key(cart.customer_id): cart.id,
+        }, self.timeout)
+
+    def delete(self, cart):
+        deleted = self.cache.delete(self.cart_key(cart.id))
+        if self.cache.get(self.latest_key(cart.customer_id)) == cart.id:
+            self.cache.delete(self.latest_key(cart.customer_id))
+        return deleted
+
+    @contextmanager
+    def lock(self, cart_id):
+        key, token = f"{self.cart_key(cart_id)}:lock", uuid.uuid4().hex
+        deadline = time.monotonic() + self.lock_wait
+        # `add` only sets missing keys, one request at a time gets the lock
+        while not self.cache.add(key, token, self.lock_timeout):
+            if time.monotonic() >= deadline:
+                raise _failed("The cart is being changed by another request. Please try again.")
+            time.sleep(self.lock_retry_delay)
+        try:
+            yield
+        finally:
+            # Not the lock of a later request if this one outlived `lock_timeout`
+            if self.cache.get(key) == token:
+                self.cache.delete(key)
+
+
+def get_cart_backend():
+    return import_string(settings.CART_BACKEND)()
+
+
+def get_customer_cart(customer, cart_id, backend=None):
+    backend = backend or get_cart_backend()
+    cart_id = parse_cart_id(cart_id)
+    cart = backend.get(cart_id) if cart_id else None
+    if cart is None or not cart.belongs_to(customer):
+        return None
+    return cart
+
+
+def get_cart_items(cart):
+    # The products with their images, for the cart item responses
+    products = Product.objects.for_cart().in_bulk(cart.product_ids())
+    return cart.to_order_items(products)
+
+
+def _variant(model, lookup, value, field):
+    # First matching inventory row, as `.first()` would pick it
+    return Subquery(
+            model._base_manager.filter(product=OuterRef("pk"), **{lookup: value}).order_by("pk").values(field)[:1]
+    )
+
+
+class CartVariant(namedtuple("CartVariant", "size_quantity size_extra_price colour_quantity colour_extra_price")):
+    """
+    Quantities and extra prices of the size and colour of a cart line, a quantity is None without such an
+    inventory row.
+    """
+
+    @classmethod
+    def from_inventories(cls, product, size=None, colour=None):
+        # Reads the inventories prefetched by `ProductQuerySet.with_inventories`, in the order `.first()` picks
+        size_row = next((row for row in product.size_inventory.all() if size and row.size.title == size), None)
+        colour_row = next((row for row in product.color_inventory.all() if colour and row.colour.name == colour),
+                          None)
+        return cls(
+                size_row and size_row.quantity, size_row and size_row.extra_price,
+                colour_row and colour_row.quantity, colour_row and colour_row.extra_price,
+        )
+
+    def check(self, size=None, colour=None, in_stock=True):
+        self.check_exists(size, colour)
+        if in_stock:
+            self.check_in_stock(size, colour)
+
+    def check_exists(self, size=None, colour=None):
+        if size and self.size_quantity is None:
+            raise _failed("Size not found for the given product.")
+        if colour and self.colour_quantity is None:
+            raise _failed("Colour not found for the given product.")
+
+    def check_in_stock(self, size=None, colour=None):
+        if size and self.size_quantity <= 0:
+            raise _failed("Size for this product is out of stock")
+        if colour and self.colour_quantity <= 0:
+            raise _failed("Colour for this product is out of stock")
+
+    def extra_price(self, size=None, colour=None):
+        extra_price = 0
+        if size:
+            extra_price += self.size_extra_price or 0
+        if colour:
+            extra_price += self.colour_extra_price or 0
+        return extra_price
+
+
+def load_cart_product(product_id, size=None, colour=None):
+    """
+    The product with its images and the variant of its `size` and `colour`, read in one query plus the images.
+    """
+    products = Product.objects.for_cart()
+    if size:
+        products = products.annotate(
+                size_quantity=_variant(SizeInventory, "size__title", size, "quantity"),
+                size_extra_price=_variant(SizeInventory, "size__title", size, "extra_price"),
+        )
+    if colour:
+        products = products.annotate(
+                colour_quantity=_variant(ColourInventory, "colour__name", colour, "quantity"),
+                colour_extra_price=_variant(ColourInventory, "colour__name", colour, "extra_price"),
+        )
+    try:
+        product = products.get(pk=product_id)
+    except (Product.DoesNotExist, DjangoValidationError):
+        # Malformed IDs are rejected by the UUID field
+        raise _failed("No product with the given ID was found.")
+    return product, CartVariant(*[getattr(product, name, None) for name in CartVariant._fields])
+
+
+def build_cart_item(cart, product, size, colour, quantity, extra_price, line=None):
+    """
+    The unsaved order item of a cart line, at the product's current prices or at the ones `line` was added with.
+    """
+    item = OrderItem(
+            customer_id=cart.customer_id, order_id=cart.id, product=product, size=size, colour=colour,
+            quantity=quantity, extra_price=extra_price,
+    )
+    if line is None:
+        item.capture_prices(product)
+    else:
+        for name in OrderItem.price_fields:
+            setattr(item, name, line[name])
+    item.line_total = item.calculate_line_total()
+    return item
+
+
+class CartItemMutation:
+    """
+    Adds a line to a customer's cart or sets the quantity of the line it already has.
+
+    `load` reads the product with the matching size and colour inventories in one query (two with the product
+    images the response shows) and the cart from the cart backend, the checks and the price are done in memory
+    and `apply` stores the cart back, the database is only written at checkout.
+    """
+
+    def __init__(self, product, variant, cart, size, colour, backend):
+        self.product = product
+        self.variant = variant
+        self.cart = cart
+        self.size = size
+        self.colour = colour
+        self.backend = backend
+
+    @classmethod
+    def load(cls, customer, product_id, size=None, colour=None, cart_id=None, backend=None):
+        backend = backend or get_cart_backend()
+        cart_id = parse_cart_id(cart_id)
+        product, variant = load_cart_product(product_id, size, colour)
+        variant.check_exists(size, colour)
+
+        cart = backend.get(cart_id) if cart_id else None
+        if cart is not None and not cart.belongs_to(customer):
+            raise _failed("Invalid cart ID. Please check the provided ID.")
+        variant.check_in_stock(size, colour)
+        if cart is None:
+            cart = Cart(cart_id or uuid7(), customer.pk)
+        return cls(product, variant, cart, size, colour, backend)
+
+    def apply(self, quantity):
+        with self.backend.lock(self.cart.id):
+            # Keeps the lines other requests wrote since `load`
+            self.cart = self.backend.refresh(self.cart)
+            item = build_cart_item(self.cart, self.product, self.size, self.colour, quantity,
+                                   self.variant.extra_price(self.size, self.colour))
+            self.cart.set_line(item)
+            self.backend.save(self.cart)
+        return item
+
+
+class CartBatch:
+    """
+    Applies a list of add, update and remove operations to a cart, all of them or none.
+
+    The products of the operations and of the cart are read with their inventories and images in four queries
+    whatever the number of operations, the operations are checked and priced in memory and the cart is stored once.
+    Operations are dicts with an `op`, a `product_id` and optionally a `size`, a `colour` and a `quantity`.
+    """
+    operations = ("add", "update", "remove")
+
+    def __init__(self, customer, cart_id=None, backend=None):
+        self.backend = backend or get_cart_backend()
+        cart_id = parse_cart_id(cart_id)
+        cart = self.backend.get(cart_id) if cart_id else None
+        if cart is not None and not cart.belongs_to(customer):
+            raise _failed("Invalid cart ID. Please check the provided ID.")
+        self.cart = cart or Cart(cart_id or uuid7(), customer.pk)
+
+    def apply(self, operations):
+        """
+        Returns the unsaved order items of the whole cart once every operation is applied.
+        """
+        with self.backend.lock(self.cart.id):
+            self.cart = self.backend.refresh(self.cart)
+            product_ids = {str(operation["product_id"]) for operation in operations} | self.cart.product_ids()
+            products = Product.objects.for_cart().with_inventories().in_bulk(product_ids)
+            for index, operation in enumerate(operations):
+                try:
+                    self.apply_operation(operation, products)
+                except ValidationError as error:
+                    raise CartOperationError(error.detail["message"], index)
+            self.backend.update(self.cart)
+        return self.cart.to_order_items(products)
+
+    def apply_operation(self, operation, products):
+        product_id = uuid.UUID(str(operation["product_id"]))
+        product = products.get(product_id)
+        # Lines of products that are no longer available can still be removed
+        if product is None and not (operation["op"] == "remove" and self.cart.get_product_line(product_id)):
+            raise _failed("No product with the given ID was found.")
+        size, colour, quantity = operation.get("size"), operation.get("colour"), operation.get("quantity")
+
+        if operation["op"] == "add":
+            variant = CartVariant.from_inventories(product, size, colour)
+            variant.check(size, colour)
+            if quantity == 0:
+                self.cart.remove_line(product.pk, size, colour)
+            else:
+                self.cart.set_line(build_cart_item(self.cart, product, size, colour, quantity,
+                                                   variant.extra_price(size, colour)))
+            return
+
+        if operation["op"] == "remove" and (size or colour):
+            line = self.cart.lines.get(self.cart.line_key(product_id, size, colour))
+        else:
+            line = self.cart.get_product_line(product_id)
+        if line is None:
+            raise _failed("Cart item does not exist. Please add the product to the cart first.")
+        self.cart.remove_line(product_id, line["size"], line["colour"])
+        if operation["op"] == "remove" or quantity == 0:
+            return
+
+        # Updates change the size, colour or quantity of the product's line and keep its prices
+        size, colour = size or line["size"], colour or line["colour"]
+        variant = CartVariant.from_inventories(product, size, colour)
+        variant.check(size, colour, in_stock=False)
+        quantity = line["quantity"] if quantity is None else quantity
+        self.cart.set_line(build_cart_item(self.cart, product, size, colour, quantity,
+                                           variant.extra_price(size, colour), line))
+
+
+def redeem_coupon(code):
+    """
+    Marks an unexpired coupon as used and returns its discount, in the transaction of the order it is applied to.
+    """
+    coupon = CouponCode.objects.select_for_update() \
+        .filter(code=code, expired=False, expiry_date__gt=timezone.now()).first()
+    if coupon is None:
+        raise _failed("Invalid coupon code")
+    coupon.expired = True
+    coupon.save()
+    return coupon.price
+
+
+def checkout_cart(cart, transaction_ref, backend=None, coupon_code=None):
+    """
+    Creates the order of a cart and its items with two inserts, at the prices of checkout time, and drops the cart.
+
+    The order is written in its own transaction, never nested in another one: the cart is dropped before and put
+    back when the transaction fails, which a savepoint in an outer transaction could not guarantee.
+    """
+    backend = backend or get_cart_backend()
+    with backend.lock(cart.id):
+        # Lines added until the lock was taken are ordered too
+        cart = backend.get(cart.id)
+        if cart is None or not cart.lines:
+            raise _failed("Cart not found")
+        products = Product.objects.for_cart().prefetch_related(None).in_bulk(cart.product_ids())
+        items = cart.to_order_items(products)
+        unavailable_product_ids = cart.unavailable_product_ids(items)
+        if unavailable_product_ids:
+            raise ValidationError({
+                "message": "Some products in the cart are no longer available",
+                "unavailable_product_ids": unavailable_product_ids,
+                "status": "failed",
+            })
+
+        order = Order(customer_id=cart.customer_id, transaction_ref=transaction_ref)
+        for item in items:
+            item.order = order
+            item.capture_prices()
+            # bulk_create does not go through save()
+            item.line_total = item.calculate_line_total()
+
+        if not backend.delete(cart):
+            # Checked out by a concurrent request
+            raise _failed("Cart not found")
+        try:
+            with transaction.atomic(durable=True):
+                if coupon_code:
+                    order.coupon_discount = redeem_coupon(coupon_code)
+                Order.objects.bulk_create([order])
+                OrderItem.objects.bulk_create(items)
+        except Exception:
+            backend.save(cart)
+            raise
+    return order
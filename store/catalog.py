@@ -0,0 +1,308 @@
+import csv
+import json
+from decimal import Decimal
+from itertools import islice
+
+import orjson
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from store.facets import invalidate_product_facets
+from store.feeds import invalidate_home_feed
+from store.flash_sales import reset_schedule
+from store.models import Category, Colour, ColourInventory, Product, ProductImage, Size, SizeInventory
+from store.related import rebuild_related_products
+from store.search import get_search_backend
+
+# Columns of a catalog file besides the variants. Products are matched on their unique title.
+PRODUCT_FIELDS = (
+    "title", "category", "description", "style", "price", "shipped_out_days", "shipping_fee", "inventory",
+    "percentage_off", "condition", "location", "flash_sale_start_date", "flash_sale_end_date",
+)
+# Written to CSV as `S:5:1.50|M:3:0` and `Red:4:0|Blue:2:0`, images as `path|path`
+VARIANT_FIELDS = ("sizes", "colours", "images")
+VARIANT_SEPARATOR = "|"
+
+# Exports add the URLs of the images, which imports ignore
+EXPORT_FIELDS = (*PRODUCT_FIELDS, *VARIANT_FIELDS, "image_urls")
+
+CATALOG_FORMATS = ("csv", "jsonl")
+CATALOG_CONTENT_TYPES = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+
+
+def read_catalog(file, catalog_format):
+    """
+    Yields the (line number, row) pairs of a CSV or JSON lines catalog file without loading it whole.
+    """
+    if catalog_format == "csv":
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except json.JSONDecodeError as error:
+            raise ValueError(f"Line {line_number} is not valid JSON: {error}")
+
+
+def _clean(field, value):
+    if value is None or value == "":
+        if field.has_default():
+            return field.get_default()
+        if field.null:
+            return None
+    if isinstance(value, float):
+        # JSON numbers, their shortest representation is what was written
+        value = str(value)
+    value = field.clean(value, None)
+    if field.get_internal_type() == "DateTimeField" and value is not None and timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def _split_variants(value):
+    # JSON lines files may hold lists of objects instead of the CSV notation
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [variant.split(":") for variant in value.split(VARIANT_SEPARATOR) if variant]
+    return value
+
+
+class CatalogImporter:
+    """
+    Creates or updates products with their inventories and images from catalog rows, a batch at a time.
+
+    Categories, sizes and colours are resolved by title or name from maps loaded once, each batch is written
+    with bulk queries in its own transaction. Bulk queries skip the model signals, so the search index is
+    updated per batch and the related products, flash sale schedule, home feed and facets once in `finish`.
+    """
+
+    def __init__(self, using="default", batch_size=1000):
+        self.using = using
+        self.batch_size = batch_size
+        self.categories = dict(Category.objects.using(using).values_list("title", "pk"))
+        self.sizes = dict(Size.objects.using(using).values_list("title", "pk"))
+        self.colours = dict(Colour.objects.using(using).values_list("name", "pk"))
+        self.created = self.updated = 0
+        self.errors = []
+        self.category_ids = set()
+
+    def import_rows(self, rows):
+        rows = iter(rows)
+        while batch := list(islice(rows, self.batch_size)):
+            self.import_batch(batch)
+            yield len(batch)
+
+    def import_batch(self, rows):
+        products = {}
+        for line_number, row in rows:
+            try:
+                parsed = self.parse_row(row)
+            except ValidationError as error:
+                self.errors.append((line_number, "; ".join(error.messages)))
+                continue
+            # A later row for the same title wins
+            products[parsed[0]["title"]] = parsed
+
+        if not products:
+            return
+        with transaction.atomic(using=self.using):
+            self.write_products(products)
+
+    def parse_row(self, row):
+        if not isinstance(row, dict):
+            # JSON lines holding a list, a string or a number
+            raise ValidationError("Rows must be objects.")
+        fields = {}
+        for name in PRODUCT_FIELDS:
+            value = row.get(name)
+            if name == "category":
+                if value not in self.categories:
+                    raise ValidationError(f"Unknown category {value!r}.")
+                fields["category_id"] = self.categories[value]
+                continue
+            try:
+                fields[name] = _clean(Product._meta.get_field(name), value)
+            except ValidationError as error:
+                raise ValidationError(f"{name}: {' '.join(error.messages)}")
+
+        sizes = [self._parse_variant(variant, "size", self.sizes, SizeInventory)
+                 for variant in _split_variants(row.get("sizes"))]
+        colours = [self._parse_variant(variant, "colour", self.colours, ColourInventory)
+                   for variant in _split_variants(row.get("colours"))]
+        images = row.get("images") or []
+        if isinstance(images, str):
+            images = images.split(VARIANT_SEPARATOR)
+        return fields, sizes, colours, [image for image in images if image]
+
+    @staticmethod
+    def _parse_variant(variant, key, ids, model):
+        if isinstance(variant, dict):
+            title, quantity, extra_price = variant.get(key), variant.get("quantity"), variant.get("extra_price")
+        else:
+            title, quantity, extra_price, *_ = [*variant, None, None]
+        if title not in ids:
+            raise ValidationError(f"Unknown {key} {title!r}.")
+        try:
+            quantity = _clean(model._meta.get_field("quantity"), quantity)
+            extra_price = _clean(model._meta.get_field("extra_price"), extra_price)
+        except ValidationError as error:
+            raise ValidationError(f"{key} {title}: {' '.join(error.messages)}")
+        return ids[title], quantity, extra_price or Decimal(0)
+
+    def write_products(self, products):
+        now = timezone.now()
+        existing = {
+            title: (pk, category_id) for title, pk, category_id in Product._base_manager.using(self.using)
+            .filter(title__in=products).values_list("title", "pk", "category_id")
+        }
+
+        to_create, to_update = [], []
+        for title, (fields, *_) in products.items():
+            product = Product(**fields)
+            if title in existing:
+                product.pk, previous_category_id = existing[title]
+                # bulk_update does not fill in auto_now fields, the ETags depend on it
+                product.updated = now
+                self.category_ids.add(previous_category_id)
+                to_update.append(product)
+            else:
+                to_create.append(product)
+            product.update_effective_price()
+            product.update_flash_sale_status(now)
+            self.category_ids.add(product.category_id)
+
+        manager = Product._base_manager.using(self.using)
+        manager.bulk_create(to_create, batch_size=self.batch_size)
+        update_fields = [name for name in PRODUCT_FIELDS if name != "title"]
+        manager.bulk_update(to_update, [*update_fields, "effective_price", "is_on_flash_sale", "updated"],
+                            batch_size=self.batch_size)
+        self.created += len(to_create)
+        self.updated += len(to_update)
+
+        product_ids = {product.title: product.pk for product in [*to_create, *to_update]}
+        self.write_inventories(SizeInventory, "size_id", {
+            product_ids[title]: sizes for title, (_, sizes, _, _) in products.items()
+        })
+        self.write_inventories(ColourInventory, "colour_id", {
+            product_ids[title]: colours for title, (_, _, colours, _) in products.items()
+        })
+        self.write_images({product_ids[title]: images for title, (*_, images) in products.items()})
+        get_search_backend(self.using).index_products(list(product_ids.values()), using=self.using)
+
+    def write_inventories(self, model, key, variants):
+        # Variants missing from the file are left as they are
+        manager = model._base_manager.using(self.using)
+        existing = {
+            (product_id, variant_id): pk for pk, product_id, variant_id in manager
+            .filter(product_id__in=variants).values_list("pk", "product_id", key)
+        }
+        to_create, to_update = [], []
+        for product_id, rows in variants.items():
+            for variant_id, quantity, extra_price in rows:
+                inventory = model(product_id=product_id, quantity=quantity, extra_price=extra_price,
+                                  **{key: variant_id})
+                if (product_id, variant_id) in existing:
+                    inventory.pk = existing[product_id, variant_id]
+                    to_update.append(inventory)
+                else:
+                    to_create.append(inventory)
+        manager.bulk_create(to_create, batch_size=self.batch_size)
+        manager.bulk_update(to_update, ["quantity", "extra_price"], batch_size=self.batch_size)
+
+    def write_images(self, images):
+        # Paths of files already in the media storage, their variants are generated by `generate_image_derivatives`
+        manager = ProductImage._base_manager.using(self.using)
+        existing = set(manager.filter(product_id__in=images).values_list("product_id", "_image"))
+        manager.bulk_create([
+            ProductImage(product_id=product_id, _image=name)
+            for product_id, names in images.items() for name in dict.fromkeys(names)
+            if (product_id, name) not in existing
+        ], batch_size=self.batch_size)
+
+    def finish(self):
+        with transaction.atomic(using=self.using):
+            rebuild_related_products(self.category_ids, self.using)
+            reset_schedule()
+            invalidate_home_feed(self.using)
+            invalidate_product_facets()
+
+
+def export_queryset(using="default"):
+    # Sold out products are part of the catalog too
+    return Product._base_manager.using(using) \
+        .select_related("category") \
+        .defer("search_vector") \
+        .prefetch_related(
+            Prefetch("size_inventory", queryset=SizeInventory._base_manager.select_related("size").order_by("pk")),
+            Prefetch("color_inventory",
+                     queryset=ColourInventory._base_manager.select_related("colour").order_by("pk")),
+            Prefetch("images", queryset=ProductImage._base_manager.order_by("pk")),
+        ) \
+        .order_by("created", "pk")
+
+
+def export_rows(using="default", chunk_size=1000):
+    """
+    Yields the catalog rows of every product, the inventories and images are prefetched a chunk at a time.
+    """
+    for product in export_queryset(using).iterator(chunk_size=chunk_size):
+        row = {name: getattr(product, name) for name in PRODUCT_FIELDS if name != "category"}
+        row["category"] = product.category.title
+        row["location"] = product.location.code
+        row["sizes"] = [
+            {"size": inventory.size.title, "quantity": inventory.quantity, "extra_price": inventory.extra_price}
+            for inventory in product.size_inventory.all()
+        ]
+        row["colours"] = [
+            {"colour": inventory.colour.name, "quantity": inventory.quantity, "extra_price": inventory.extra_price}
+            for inventory in product.color_inventory.all()
+        ]
+        row["images"] = [image._image.name for image in product.images.all()]
+        row["image_urls"] = [image.urls for image in product.images.all()]
+        yield {name: row[name] for name in EXPORT_FIELDS}
+
+
+class _Echo:
+    # File-like object handing back what the csv writer writes, see the Django streaming CSV how-to
+    @staticmethod
+    def write(value):
+        return value
+
+
+def _csv_value(name, value):
+    if name in ("sizes", "colours"):
+        key = "size" if name == "sizes" else "colour"
+        return VARIANT_SEPARATOR.join(
+            f"{variant[key]}:{variant['quantity']}:{variant['extra_price'] or 0}" for variant in value
+        )
+    if name == "images":
+        return VARIANT_SEPARATOR.join(value)
+    if name == "image_urls":
+        return VARIANT_SEPARATOR.join(urls["original"] for urls in value)
+    if value is None:
+        return ""
+    if name in ("flash_sale_start_date", "flash_sale_end_date"):
+        return value.isoformat()
+    return value
+
+
+def render_catalog(rows, catalog_format):
+    """
+    Yields the lines of a catalog file in the format `import_catalog` reads.
+    """
+    if catalog_format == "csv":
+        writer = csv.writer(_Echo())
+        yield writer.writerow(EXPORT_FIELDS)
+        for row in rows:
+            yield writer.writerow([_csv_value(name, value) for name, value in row.items()])
+        return
+    for row in rows:
+        # Decimals as strings, so prices are read back exactly
+        yield orjson.dumps(row, default=str).decode() + "\n"
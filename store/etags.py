@@ -0,0 +1,40 @@
+import hashlib
+import uuid
+
+from django.db.models import Count, Max, Subquery
+
+from store.models import Product
+from store.taxonomy import get_category_taxonomy_version
+
+
+def _make_etag(request, *parts):
+    # The browsable API and JSON are different representations of the same state
+    key = "|".join([request.accepted_renderer.format, request.get_full_path(), *map(str, parts)])
+    return hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()
+
+
+def category_list_etag(request, *args, **kwargs):
+    # Bumped with every category save or delete, so no query is needed
+    return _make_etag(request, get_category_taxonomy_version())
+
+
+def product_list_etag(request, *args, **kwargs):
+    # Images, inventories and reviews move `Product.updated` too, see store.signals
+    state = Product._base_manager.aggregate(
+            count=Count("pk"), last_updated=Max("updated"), category_updated=Max("category__updated")
+    )
+    return _make_etag(request, state["count"], state["last_updated"], state["category_updated"])
+
+
+def product_detail_etag(request, product_id=None, *args, **kwargs):
+    try:
+        uuid.UUID(str(product_id))
+    except ValueError:
+        # Left to the view to answer
+        return None
+    # The details embed the related products, i.e. the rest of the category
+    category = Product._base_manager.filter(pk=product_id).values("category_id")
+    state = Product._base_manager.filter(category_id=Subquery(category)).aggregate(
+            count=Count("pk"), last_updated=Max("updated"), category_updated=Max("category__updated")
+    )
+    return _make_etag(request, state["count"], state["last_updated"], state["category_updated"])
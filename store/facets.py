@@ -0,0 +1,102 @@
+import hashlib
+import json
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, Count, IntegerField, Value, When
+from django_countries import countries
+from rest_framework.settings import api_settings
+
+from store.cache import bump_cache_version, versioned_cache_key
+from store.choices import CONDITION_CHOICES, GENDER_CHOICES
+from store.filters import ProductFilter
+from store.models import ColourInventory, Product, SizeInventory
+from store.search import get_search_terms
+
+PRODUCT_FACETS_NAMESPACE = "product_facets"
+
+
+def facets_cache_key(query_params):
+    """
+    Cache key of the facets of a product filter query, equivalent queries share it.
+    """
+    form = ProductFilter(query_params, queryset=Product.objects.none()).form
+    # Only called once the filters were validated by the view
+    form.is_valid()
+    filters = {name: value for name, value in form.cleaned_data.items()
+               if name != "ordering" and value not in (None, "", [])}
+    search = get_search_terms(query_params.get(api_settings.SEARCH_PARAM, ""))
+    key = json.dumps({"filters": filters, "search": search}, sort_keys=True, default=str)
+    return versioned_cache_key(PRODUCT_FACETS_NAMESPACE, hashlib.md5(key.encode(), usedforsecurity=False).hexdigest())
+
+
+def _price_buckets():
+    bounds = settings.PRODUCT_FACET_PRICE_BUCKETS
+    return list(zip([0, *bounds], [*bounds, None]))
+
+
+def build_product_facets(queryset):
+    """
+    Counts the products of `queryset` per category, gender, condition, location, size, colour and price range.
+
+    Four grouped queries whatever the number of facet values: categories (genders are summed from them),
+    condition x location x price range, sizes and colours.
+    """
+    # Filtering on the ids keeps the search annotations and ordering out of the GROUP BY
+    products = Product._base_manager.using(queryset.db).filter(pk__in=queryset.order_by().values("pk")).order_by()
+    buckets = _price_buckets()
+
+    categories, genders = [], Counter()
+    for row in products.values("category_id", "category__title", "category__gender") \
+            .annotate(count=Count("pk")).order_by("category__title"):
+        categories.append({"id": row["category_id"], "title": row["category__title"], "count": row["count"]})
+        genders[row["category__gender"]] += row["count"]
+
+    conditions, locations, prices = Counter(), Counter(), Counter()
+    bucket = Case(*[When(effective_price__lt=upper, then=Value(index)) for index, (_, upper) in enumerate(buckets)
+                    if upper is not None], default=Value(len(buckets) - 1), output_field=IntegerField())
+    for row in products.annotate(price_bucket=bucket).values("condition", "location", "price_bucket") \
+            .annotate(count=Count("pk")):
+        conditions[row["condition"]] += row["count"]
+        locations[row["location"]] += row["count"]
+        prices[row["price_bucket"]] += row["count"]
+
+    sizes = SizeInventory._base_manager.using(queryset.db) \
+        .filter(product__in=products, quantity__gt=0) \
+        .values("size__title") \
+        .annotate(count=Count("product", distinct=True)) \
+        .order_by("size__title")
+    colours = ColourInventory._base_manager.using(queryset.db) \
+        .filter(product__in=products, quantity__gt=0) \
+        .values("colour__name", "colour__hex_code") \
+        .annotate(count=Count("product", distinct=True)) \
+        .order_by("colour__name")
+
+    return {
+        "categories": categories,
+        "genders": [{"value": value, "label": label, "count": genders[value]}
+                    for value, label in GENDER_CHOICES if genders[value]],
+        "conditions": [{"value": value, "label": label, "count": conditions[value]}
+                       for value, label in CONDITION_CHOICES if conditions[value]],
+        "locations": [{"value": code, "label": countries.name(code), "count": count}
+                      for code, count in sorted(locations.items()) if code],
+        "sizes": [{"title": row["size__title"], "count": row["count"]} for row in sizes],
+        "colours": [{"name": row["colour__name"], "hex_code": row["colour__hex_code"], "count": row["count"]}
+                    for row in colours],
+        # Bounds of the effective price, the lower one included, for the `effective_price_min/max` filters
+        "price_ranges": [{"min": lower, "max": upper, "count": prices[index]}
+                         for index, (lower, upper) in enumerate(buckets) if prices[index]],
+    }
+
+
+def get_product_facets(queryset, key):
+    facets = cache.get(key)
+    if facets is None:
+        facets = build_product_facets(queryset)
+        cache.set(key, facets, settings.PRODUCT_FACETS_CACHE_TIMEOUT)
+    return facets
+
+
+def invalidate_product_facets():
+    bump_cache_version(PRODUCT_FACETS_NAMESPACE)
@@ -0,0 +1,127 @@
+from collections import defaultdict
+from operator import itemgetter
+
+from rest_framework import serializers
+
+from store.models import ColourInventory, ProductImage, SizeInventory, calculate_discount_price
+
+# The DRF fields themselves do the formatting, so decimals are quantized and coerced exactly like the serializers do
+_price_field = serializers.DecimalField(max_digits=6, decimal_places=2, default=0)
+
+
+def _nullable(convert):
+    # Serializer.to_representation renders a missing attribute as None without calling the field
+    return lambda value: None if value is None else convert(value)
+
+
+_to_str = _nullable(str)
+_to_int = _nullable(int)
+_to_decimal = _nullable(_price_field.to_representation)
+
+
+def _column(name, convert):
+    get = itemgetter(name)
+    return lambda row: convert(get(row))
+
+
+def _discount_price(row):
+    return _to_decimal(calculate_discount_price(row["price"], row["percentage_off"]))
+
+
+class CompiledProductSerializer:
+    """
+    Read-only counterpart of `ProductSerializer` working on `values()` rows instead of model instances.
+
+    The payload has the same keys in the same order and the same number formatting. Accessors are built once,
+    nested inventories and images are loaded with one query each for the whole batch of products.
+    """
+    value_fields = (
+        "id", "title", "slug", "category__title", "description", "style", "price", "percentage_off",
+        "shipped_out_days",
+    )
+    # Not serialized, selected so keyset pagination can read the cursor position from the rows
+    ordering_fields = ("created", "effective_price")
+
+    def __init__(self):
+        self.accessors = (
+            ("id", _column("id", _to_str)),
+            ("title", _column("title", _to_str)),
+            ("slug", _column("slug", _to_str)),
+            ("category", _column("category__title", _to_str)),
+            ("description", _column("description", _to_str)),
+            ("style", _column("style", _to_str)),
+            ("price", _column("price", _to_decimal)),
+            ("percentage_off", _column("percentage_off", _to_int)),
+            ("discount_price", _discount_price),
+        )
+        self.trailing_accessors = (
+            ("shipped_out_days", _column("shipped_out_days", _to_int)),
+        )
+        self.image_url = ProductImage._meta.get_field("_image").storage.url
+
+    def get_rows(self, queryset):
+        # Annotations such as the search rank stay selected for the ordering
+        return queryset.prefetch_related(None) \
+            .values(*self.value_fields, *self.ordering_fields, *queryset.query.annotations)
+
+    def serialize(self, queryset):
+        return self.to_representation(list(self.get_rows(queryset)))
+
+    def to_representation(self, rows):
+        if not rows:
+            return []
+        product_ids = [row["id"] for row in rows]
+        images, sizes, colours = self._load_images(product_ids), self._load_sizes(product_ids), \
+            self._load_colours(product_ids)
+
+        data = []
+        for row in rows:
+            product_id = row["id"]
+            item = {key: accessor(row) for key, accessor in self.accessors}
+            product_images = images.get(product_id, [])
+            item["images"] = [urls["original"] for urls in product_images]
+            item["image_urls"] = product_images
+            item["size_inventory"] = sizes.get(product_id, [])
+            item["color_inventory"] = colours.get(product_id, [])
+            for key, accessor in self.trailing_accessors:
+                item[key] = accessor(row)
+            data.append(item)
+        return data
+
+    def _load_images(self, product_ids):
+        images = defaultdict(list)
+        queryset = ProductImage.objects.filter(product_id__in=product_ids).order_by("pk") \
+            .values_list("product_id", "_image", "image_urls")
+        for product_id, name, urls in queryset:
+            # Same fallback as ProductImage.urls for images stored before their URLs were
+            images[product_id].append(urls or {"original": self.image_url(name)})
+        return images
+
+    @staticmethod
+    def _load_sizes(product_ids):
+        sizes = defaultdict(list)
+        queryset = SizeInventory.objects.select_related(None).filter(product_id__in=product_ids).order_by("pk") \
+            .values_list("product_id", "size__title", "quantity", "extra_price")
+        for product_id, title, quantity, extra_price in queryset:
+            sizes[product_id].append({
+                "size": {"title": _to_str(title)},
+                "quantity": _to_int(quantity),
+                "extra_price": _to_decimal(extra_price),
+            })
+        return sizes
+
+    @staticmethod
+    def _load_colours(product_ids):
+        colours = defaultdict(list)
+        queryset = ColourInventory.objects.select_related(None).filter(product_id__in=product_ids).order_by("pk") \
+            .values_list("product_id", "colour__name", "colour__hex_code", "quantity", "extra_price")
+        for product_id, name, hex_code, quantity, extra_price in queryset:
+            colours[product_id].append({
+                "colour": {"name": _to_str(name), "hex_code": _to_str(hex_code)},
+                "quantity": _to_int(quantity),
+                "extra_price": _to_decimal(extra_price),
+            })
+        return colours
+
+
+product_list_serializer = CompiledProductSerializer()
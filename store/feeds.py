@@ -0,0 +1,86 @@
+import math
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.utils import timezone
+
+from common.renderers import ORJSONRenderer
+from store.cache import bump_cache_version, versioned_cache_key
+from store.fast_serializers import product_list_serializer
+from store.flash_sales import get_next_boundary, sync_flash_sales_if_due
+from store.models import Product
+from store.taxonomy import get_category_taxonomy
+
+HOME_FEED_NAMESPACE = "home_feed"
+
+_rebuild_lock = threading.Lock()
+_rebuild_pending = False
+
+
+def build_home_feed():
+    categories = get_category_taxonomy()["all_categories"]
+    products_without_flash_sales = Product.objects.for_listing().filter(flash_sale_start_date=None,
+                                                                        flash_sale_end_date=None)
+    products_with_flash_sales = Product.objects.for_listing().filter(is_on_flash_sale=True)
+    mega_sales = products_without_flash_sales.filter(percentage_off__gte=24)
+
+    data = {'categories': categories,
+            'product_without_flash_sales': product_list_serializer.serialize(products_without_flash_sales),
+            'products_with_flash_sales': product_list_serializer.serialize(products_with_flash_sales),
+            'mega_sales': product_list_serializer.serialize(mega_sales)}
+    return ORJSONRenderer().render({"message": "Fetched all products", "data": data, "status": "success"})
+
+
+def rebuild_home_feed():
+    """
+    Renders the feed and stores the JSON bytes, returns them.
+    """
+    now = timezone.now()
+    key = versioned_cache_key(HOME_FEED_NAMESPACE)
+    content = build_home_feed()
+
+    timeout = settings.HOME_FEED_CACHE_TIMEOUT
+    boundary = get_next_boundary()
+    if boundary is not None:
+        # A flash sale starting or ending changes the feed, the entry must not outlive it
+        timeout = min(timeout, max(1, math.ceil((boundary - now).total_seconds())))
+    cache.set(key, content, timeout)
+    return content
+
+
+def get_home_feed():
+    sync_flash_sales_if_due()
+    content = cache.get(versioned_cache_key(HOME_FEED_NAMESPACE))
+    if content is None:
+        content = rebuild_home_feed()
+    return content
+
+
+def _rebuild_home_feed_in_background():
+    global _rebuild_pending
+    with _rebuild_lock:
+        _rebuild_pending = False
+    try:
+        rebuild_home_feed()
+    finally:
+        # The thread opened its own connections
+        connections.close_all()
+
+
+def _schedule_home_feed_rebuild():
+    global _rebuild_pending
+    with _rebuild_lock:
+        # Bulk changes fire many signals, one rebuild covers all of them
+        if _rebuild_pending:
+            return
+        _rebuild_pending = True
+    t = threading.Thread(target=_rebuild_home_feed_in_background)
+    t.start()
+
+
+def invalidate_home_feed(using="default"):
+    bump_cache_version(HOME_FEED_NAMESPACE)
+    # Rebuilt once the change is visible to other connections, requests in between render the feed themselves
+    transaction.on_commit(_schedule_home_feed_rebuild, using=using)
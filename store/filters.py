@@ -1,11 +1,42 @@
 from django_filters.rest_framework import FilterSet, filters
+from rest_framework.filters import SearchFilter
 
-from store.choices import CONDITION_CHOICES, GENDER_CHOICES
+from store.choices import CONDITION_CHOICES, GENDER_CHOICES, RATING_CHOICES
+from store.search import get_search_backend
 
 
 class ProductFilter(FilterSet):
     gender = filters.ChoiceFilter(field_name='category__gender', lookup_expr='exact', choices=GENDER_CHOICES)
-    title = filters.CharFilter(lookup_expr='icontains')
+    title = filters.CharFilter(method='filter_title')
     price = filters.NumericRangeFilter(lookup_expr='range')
+    effective_price = filters.NumericRangeFilter(lookup_expr='range')
     condition = filters.ChoiceFilter(lookup_expr='exact', choices=CONDITION_CHOICES)
     location = filters.CharFilter(lookup_expr='icontains')
+    ordering = filters.OrderingFilter(fields=('effective_price', 'created'))
+
+    @staticmethod
+    def filter_title(queryset, name, value):
+        # Prefix match on the title through the full-text index instead of a LIKE '%value%' scan
+        return get_search_backend(queryset.db).search(queryset, value, fields=(name,), rank=False)
+
+
+class ProductReviewFilter(FilterSet):
+    ratings = filters.MultipleChoiceFilter(choices=RATING_CHOICES)
+
+
+class ProductSearchFilter(SearchFilter):
+    """
+    Full-text search over the product title and description, best matches first.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        search_terms = self.get_search_terms(request)
+        if not search_terms:
+            return queryset
+
+        backend = get_search_backend(queryset.db)
+        queryset = backend.search(queryset, " ".join(search_terms))
+        if queryset.query.order_by:
+            # An explicit ?ordering= wins over relevance
+            return queryset
+        return queryset.order_by(f"-{backend.rank_field}", "-created")
@@ -0,0 +1,66 @@
+from django.core.cache import cache
+from django.db.models import Min, Q
+from django.dispatch import Signal
+from django.utils import timezone
+
+from store.models import Product
+
+NEXT_BOUNDARY_KEY = "store:flash_sales:next_boundary"
+
+# Sent after products were flipped in or out of a flash sale, the queryset updates bypass post_save
+flash_sales_changed = Signal()
+
+_missing = object()
+
+
+def compute_next_boundary(now, using="default"):
+    """
+    The next time a flash sale starts or ends, i.e. the next time `is_on_flash_sale` has to be flipped.
+    """
+    boundaries = Product._base_manager.using(using).aggregate(
+            next_start=Min("flash_sale_start_date", filter=Q(flash_sale_start_date__gt=now)),
+            next_end=Min("flash_sale_end_date", filter=Q(flash_sale_end_date__gt=now)),
+    )
+    return min((boundary for boundary in boundaries.values() if boundary is not None), default=None)
+
+
+def get_next_boundary(using="default"):
+    boundary = cache.get(NEXT_BOUNDARY_KEY, _missing)
+    if boundary is _missing:
+        boundary = compute_next_boundary(timezone.now(), using)
+        cache.set(NEXT_BOUNDARY_KEY, boundary, None)
+    return boundary
+
+
+def reset_schedule():
+    cache.delete(NEXT_BOUNDARY_KEY)
+
+
+def sync_flash_sales(now=None, using="default"):
+    """
+    Flips `is_on_flash_sale` for the products whose window opened or closed and stores the next boundary.
+
+    Returns the number of products that started and ended their flash sale.
+    """
+    now = now or timezone.now()
+    products = Product._base_manager.using(using)
+    # The sale is over from its end date on, the boundary the next sync is scheduled at
+    in_window = Q(flash_sale_start_date__lte=now, flash_sale_end_date__gt=now)
+
+    started = products.filter(in_window, is_on_flash_sale=False).update(is_on_flash_sale=True)
+    ended = products.filter(is_on_flash_sale=True).exclude(in_window).update(is_on_flash_sale=False)
+    cache.set(NEXT_BOUNDARY_KEY, compute_next_boundary(now, using), None)
+
+    if started or ended:
+        flash_sales_changed.send(sender=Product, started=started, ended=ended, using=using)
+    return started, ended
+
+
+def sync_flash_sales_if_due(using="default"):
+    """
+    Runs the sync when a boundary passed since the last one, costs a single cache read otherwise.
+    """
+    now = timezone.now()
+    boundary = cache.get(NEXT_BOUNDARY_KEY, _missing)
+    if boundary is _missing or (boundary is not None and boundary <= now):
+        sync_flash_sales(now, using)
@@ -0,0 +1,67 @@
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from common.renderers import ORJSONRenderer
+
+
+def product_listing_payload(count):
+    # Same shape and value types as the filtered product list response
+    return {"message": "Products filtered successfully", "data": [
+        {
+            "id": str(uuid.uuid4()), "title": f"Product {i}", "slug": f"product-{i}", "category": "Electronics",
+            "description": "A product description " * 5, "style": "Plain", "price": Decimal("19.99"),
+            "percentage_off": i % 50, "discount_price": Decimal("17.99"), "images": [f"/media/product-{i}.png"],
+            "size_inventory": [{"size": {"title": "M"}, "quantity": 5, "extra_price": Decimal("1.50")}],
+            "color_inventory": [{"colour": {"name": "Red", "hex_code": "#ff0000"}, "quantity": 5,
+                                 "extra_price": Decimal("0.00")}],
+            "shipped_out_days": 2,
+        } for i in range(count)
+    ], "next": None, "previous": None, "status": "success"}
+
+
+def order_payload(count):
+    # Order items carry raw decimals and datetimes, see OrderSerializer.get_items
+    placed_at = timezone.now()
+    return {"message": "Order fetched", "data": {
+        "id": uuid.uuid4(), "transaction_ref": "ref-1234", "all_total_price": Decimal("2499.90"),
+        "placed_at": placed_at.isoformat(), "address": uuid.uuid4(), "shipping_status": "P", "payment_status": "P",
+        "items": [
+            {"customer": "John Doe", "title": f"Product {i}", "price": Decimal("19.99"),
+             "shipping_fee": Decimal("5.00"), "shipping_out_date": placed_at + timedelta(days=2), "quantity": 2,
+             "size": "M", "colour": "Red"} for i in range(count)
+        ],
+    }, "status": "success"}
+
+
+class Command(BaseCommand):
+    help = 'Compares the DRF JSON renderer with the orjson one on product listing and order payloads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=1000, help='Number of products or order items per payload.')
+        parser.add_argument('--repeat', type=int, default=20, help='Number of renders timed per renderer.')
+
+    def handle(self, *args, **options):
+        payloads = {
+            'product listing': product_listing_payload(options['count']),
+            'order': order_payload(options['count']),
+        }
+        for name, payload in payloads.items():
+            timings = {}
+            for renderer in (JSONRenderer(), ORJSONRenderer()):
+                started = time.perf_counter()
+                for _ in range(options['repeat']):
+                    content = renderer.render(payload)
+                timings[renderer.__class__.__name__] = (time.perf_counter() - started) / options['repeat'], content
+
+            (drf_seconds, drf_content), (orjson_seconds, orjson_content) = timings.values()
+            self.stdout.write(
+                    f'{name} ({len(drf_content)} bytes): DRF {drf_seconds * 1000:.2f}ms, '
+                    f'orjson {orjson_seconds * 1000:.2f}ms ({drf_seconds / orjson_seconds:.1f}x), '
+                    f'identical output: {drf_content == orjson_content}'
+            )
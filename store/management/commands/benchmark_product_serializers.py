@@ -0,0 +1,67 @@
+import time
+import uuid
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+from rest_framework.renderers import JSONRenderer
+
+from store.fast_serializers import product_list_serializer
+from store.models import Category, Colour, ColourInventory, Product, ProductImage, Size, SizeInventory
+from store.serializers import ProductSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compares the DRF product serializer with the compiled one on generated products, nothing is kept.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[1000, 10000],
+                            help='Numbers of products to serialize.')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database to generate the products in.')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        with transaction.atomic(using=using):
+            # Everything generated here is rolled back at the end
+            products = self.generate_products(max(options['sizes']), using)
+            for size in sorted(options['sizes']):
+                queryset = Product.objects.using(using).for_listing().filter(pk__in=products[:size])
+
+                started = time.perf_counter()
+                drf_data = ProductSerializer(queryset, many=True).data
+                drf_seconds = time.perf_counter() - started
+
+                started = time.perf_counter()
+                compiled_data = product_list_serializer.serialize(queryset)
+                compiled_seconds = time.perf_counter() - started
+
+                renderer = JSONRenderer()
+                identical = renderer.render(drf_data) == renderer.render(compiled_data)
+                self.stdout.write(
+                        f'{size} products: DRF {drf_seconds:.3f}s, compiled {compiled_seconds:.3f}s '
+                        f'({drf_seconds / compiled_seconds:.1f}x), identical output: {identical}'
+                )
+            transaction.set_rollback(True, using=using)
+
+    @staticmethod
+    def generate_products(count, using):
+        suffix = uuid.uuid4().hex[:8]
+        category = Category.objects.using(using).create(title=f'Benchmark {suffix}', gender='A')
+        size = Size.objects.using(using).create(title=suffix[:5])
+        colour = Colour.objects.using(using).create(name=suffix, hex_code=f'#{suffix}')
+        products = Product.objects.using(using).bulk_create([
+            Product(title=f'Product {i}', slug=f'benchmark-{suffix}-{i}', category=category,
+                    description='Benchmark product', style='Plain', price=Decimal('19.99'), shipped_out_days=2,
+                    shipping_fee=Decimal('5.00'), inventory=10, percentage_off=i % 50, location='US')
+            for i in range(count)
+        ], batch_size=1000)
+        SizeInventory.objects.using(using).bulk_create([
+            SizeInventory(product=product, size=size, quantity=5, extra_price=Decimal('1.50')) for product in products
+        ], batch_size=1000)
+        ColourInventory.objects.using(using).bulk_create([
+            ColourInventory(product=product, colour=colour, quantity=5) for product in products
+        ], batch_size=1000)
+        ProductImage.objects.using(using).bulk_create([
+            ProductImage(product=product, _image=f'store/product_images/{product.slug}.png') for product in products
+        ], batch_size=1000)
+        return [product.pk for product in products]
@@ -0,0 +1,54 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from common.uuids import uuid7
+from store.choices import NOTIFICATION_FEED
+from store.models import Notification
+
+ID_GENERATORS = {"uuid4": uuid.uuid4, "uuid7": uuid7}
+
+
+class Command(BaseCommand):
+    help = 'Compares inserting notifications with uuid4 and with time-ordered uuid7 primary keys, nothing is kept.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=100000, help='Rows inserted per primary key generator.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per INSERT.')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database to insert the rows into.')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        for name, generate_id in ID_GENERATORS.items():
+            with transaction.atomic(using=using):
+                # Everything inserted here is rolled back at the end
+                index_size = self.primary_key_index_size(using)
+                started = time.perf_counter()
+                for offset in range(0, options['count'], options['batch_size']):
+                    Notification.objects.using(using).bulk_create([
+                        Notification(id=generate_id(), notification_type=NOTIFICATION_FEED,
+                                     title=f'Benchmark {i}', description='Benchmark notification')
+                        for i in range(offset, min(offset + options['batch_size'], options['count']))
+                    ])
+                seconds = time.perf_counter() - started
+
+                message = f'{name}: {options["count"]} rows in {seconds:.2f}s ({options["count"] / seconds:.0f} rows/s)'
+                if index_size is not None:
+                    growth = self.primary_key_index_size(using) - index_size
+                    message += f', primary key index grew by {growth / 1024:.0f} kB'
+                self.stdout.write(message)
+                transaction.set_rollback(True, using=using)
+
+    @staticmethod
+    def primary_key_index_size(using):
+        # Page splits show up as index growth, only measured on PostgreSQL
+        connection = connections[using]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Notification._meta.db_table)
+            index = next(name for name, constraint in constraints.items() if constraint['primary_key'])
+            cursor.execute('SELECT pg_relation_size(%s::regclass)', [index])
+            return cursor.fetchone()[0]
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from store.catalog import CATALOG_FORMATS, export_rows, render_catalog
+
+
+class Command(BaseCommand):
+    help = 'Writes every product with its inventories and images as a CSV or JSON lines catalog file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=CATALOG_FORMATS, default='jsonl', help='Format of the file.')
+        parser.add_argument('--output', help='File to write to, the standard output by default.')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Products read from the database at once.')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database to export the products from.')
+
+    def handle(self, *args, **options):
+        lines = render_catalog(export_rows(options['database'], options['chunk_size']), options['format'])
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with open(options['output'], 'w', newline='', encoding='utf-8') as file:
+            file.writelines(lines)
@@ -0,0 +1,53 @@
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from store.catalog import CATALOG_FORMATS, CatalogImporter, read_catalog
+
+
+class Command(BaseCommand):
+    help = 'Creates or updates products, their inventories and images from a CSV or JSON lines catalog file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Catalog file, - to read from the standard input.')
+        parser.add_argument('--format', choices=CATALOG_FORMATS,
+                            help='Format of the file, guessed from its extension by default.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows written per transaction.')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database to import the products into.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        catalog_format = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if catalog_format not in CATALOG_FORMATS:
+            raise CommandError(f'Unknown catalog format {catalog_format!r}, use --format.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+
+        importer = CatalogImporter(options['database'], options['batch_size'])
+        file = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        started = time.perf_counter()
+        rows = 0
+        try:
+            for batch in importer.import_rows(read_catalog(file, catalog_format)):
+                rows += batch
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'{rows} rows, {rows / (time.perf_counter() - started):.0f} rows/s')
+        except ValueError as error:
+            # The batches before the broken line are kept
+            raise CommandError(f'{error}, {rows} rows imported.')
+        finally:
+            if file is not sys.stdin:
+                file.close()
+            # The signals skipped by the batches already written are caught up even when a line breaks the import
+            importer.finish()
+        seconds = time.perf_counter() - started
+
+        for line_number, message in importer.errors:
+            self.stderr.write(f'Line {line_number} skipped: {message}')
+        self.stdout.write(self.style.SUCCESS(
+                f'{rows} rows in {seconds:.1f}s ({rows / max(seconds, 1e-9):.0f} rows/s): {importer.created} '
+                f'products created, {importer.updated} updated, {len(importer.errors)} rows skipped.'
+        ))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from store.choices import RATING_CHOICES
+from store.models import Product, ProductReview, rating_count_field
+
+
+def _aggregate(reviews, aggregate):
+    return Coalesce(
+            Subquery(reviews.annotate(value=aggregate).values('value')), Value(0), output_field=IntegerField()
+    )
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the stored rating count, sum and per star histogram of every product from its reviews.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database to rebuild the ratings on.')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        reviews = ProductReview.objects.using(using) \
+            .filter(product=OuterRef('pk'), ratings__isnull=False) \
+            .order_by() \
+            .values('product')
+
+        with transaction.atomic(using=using):
+            updated = Product._base_manager.using(using).update(
+                    rating_count=_aggregate(reviews, Count('pk')),
+                    rating_sum=_aggregate(reviews, Sum('ratings')),
+                    **{rating_count_field(stars): _aggregate(reviews.filter(ratings=stars), Count('pk'))
+                       for stars, _ in RATING_CHOICES},
+            )
+        self.stdout.write(self.style.SUCCESS(f'Ratings rebuilt for {updated} products.'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from store.models import Category
+from store.related import rebuild_related_products
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the related products of every product.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database to rebuild the rankings on.')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        category_ids = list(Category.objects.using(using).values_list('pk', flat=True))
+        with transaction.atomic(using=using):
+            rebuild_related_products(category_ids, using)
+        self.stdout.write(self.style.SUCCESS(f'Related products rebuilt for {len(category_ids)} categories.'))
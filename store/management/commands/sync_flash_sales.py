@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from store.flash_sales import get_next_boundary, sync_flash_sales
+
+
+class Command(BaseCommand):
+    help = 'Flips products in and out of their flash sale, meant to be run from a scheduler at least every minute.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database to sync the flash sales on.')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        started, ended = sync_flash_sales(using=using)
+        boundary = get_next_boundary(using)
+        self.stdout.write(self.style.SUCCESS(
+                f'{started} flash sales started, {ended} ended. Next boundary: {boundary or "none"}.'
+        ))
@@ -1,4 +1,7 @@
+from decimal import Decimal
+
 from django.db import models
+from django.db.models.functions import Coalesce
 
 
 class AddressManager(models.Manager):
@@ -16,28 +19,102 @@ class FavoriteProductManager(models.Manager):
         return super().get_queryset().select_related('customer', 'product')
 
 
-class OrderManager(models.Manager):
+def line_total(prefix=""):
+    """
+    `OrderItem.calculate_line_total` as an expression over the prices kept on the line, `prefix` is the path to
+    the order items from the queried model.
+    """
+    def field(name):
+        return models.F(f"{prefix}{name}")
+
+    extra_price = Coalesce(field("extra_price"), models.Value(Decimal(0)))
+    shipping_fee = field("shipping_fee")
+    return models.Case(
+            models.When(
+                    models.Q(**{f"{prefix}discount_price__gt": 0}),
+                    then=field("quantity") * (field("discount_price") + extra_price) + shipping_fee,
+            ),
+            default=field("quantity") * (field("unit_price") + shipping_fee + extra_price) + shipping_fee,
+            output_field=models.DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+class OrderQuerySet(models.QuerySet):
+    def with_totals(self):
+        """
+        Annotates the total price, quantity and number of lines of each order, read by `Order.all_total_price`,
+        `Order.total_items` and `Order.items_count` instead of looping over the lines. The total sums the
+        `line_total` the lines keep, or computes it from their kept prices, so the products are not joined.
+        """
+        zero = models.Value(Decimal(0), output_field=models.DecimalField(max_digits=12, decimal_places=2))
+        order_item_total = Coalesce("order_items__line_total", line_total("order_items__"))
+        return self.annotate(
+                order_total=Coalesce(models.Sum(order_item_total), zero),
+                order_quantity=Coalesce(models.Sum("order_items__quantity"), 0),
+                order_item_count=models.Count("order_items"),
+        )
+
+
+class OrderManager(models.Manager.from_queryset(OrderQuerySet)):
     def get_queryset(self):
         return super().get_queryset().select_related('customer', 'address')
 
 
-class OrderItemManager(models.Manager):
+class OrderItemQuerySet(models.QuerySet):
+    def with_totals(self):
+        # Read by `OrderItem.total_price`, lines without a kept total are computed from their kept prices
+        return self.annotate(order_item_total=Coalesce("line_total", line_total()))
+
+
+class OrderItemManager(models.Manager.from_queryset(OrderItemQuerySet)):
     def get_queryset(self):
         return super().get_queryset().select_related('customer', 'order', 'product')
 
 
-class ProductManager(models.Manager):
+class ProductQuerySet(models.QuerySet):
+    """
+    Named projections of products, each one loads only what its endpoint serializes.
+    """
+    listing_fields = (
+        "id", "title", "slug", "category__title", "description", "style", "price", "percentage_off",
+        "effective_price", "shipped_out_days", "created",
+    )
+    cart_fields = ("id", "title", "price", "percentage_off", "effective_price", "shipping_fee", "inventory", "created")
+
+    def _inventory_prefetches(self):
+        size_inventory = self.model._meta.get_field("size_inventory").related_model
+        colour_inventory = self.model._meta.get_field("color_inventory").related_model
+        # The inventory managers also join the product back, the prefetch already knows it
+        return (
+            models.Prefetch("size_inventory", queryset=size_inventory.objects.select_related(None)
+                            .select_related("size").order_by("pk")),
+            models.Prefetch("color_inventory", queryset=colour_inventory.objects.select_related(None)
+                            .select_related("colour").order_by("pk")),
+        )
+
+    def for_listing(self):
+        return self.select_related("category") \
+            .only(*self.listing_fields) \
+            .prefetch_related(*self._inventory_prefetches(), "images")
+
+    def for_detail(self):
+        return self.select_related("category") \
+            .defer("search_vector") \
+            .prefetch_related(*self._inventory_prefetches(), "images")
+
+    def for_cart(self):
+        return self.only(*self.cart_fields).prefetch_related("images")
+
+    def with_inventories(self):
+        return self.prefetch_related(*self._inventory_prefetches())
+
+    def exists_only(self):
+        return self.only("id")
+
+
+class ProductManager(models.Manager.from_queryset(ProductQuerySet)):
     def get_queryset(self):
-        return super() \
-            .get_queryset() \
-            .prefetch_related(
-                'category',
-                'product_reviews',
-                'size_inventory',
-                'color_inventory',
-                'images'
-        ) \
-            .filter(inventory__gt=0)
+        return super().get_queryset().filter(inventory__gt=0)
 
 
 class ProductReviewManager(models.Manager):
@@ -0,0 +1,51 @@
+# Generated by Django 4.1.9 on 2026-10-17 07:02
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute(
+                "CREATE INDEX store_product_search_vector_gin ON store_product USING gin (search_vector)"
+        )
+        schema_editor.execute(
+                "UPDATE store_product SET search_vector = "
+                "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+                "setweight(to_tsvector('english', coalesce(description, '')), 'B')"
+        )
+    elif vendor == "sqlite":
+        schema_editor.execute(
+                "CREATE VIRTUAL TABLE store_product_fts USING fts5("
+                "title, description, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+        schema_editor.execute(
+                "INSERT INTO store_product_fts (rowid, title, description) "
+                "SELECT rowid, title, description FROM store_product"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS store_product_search_vector_gin")
+    elif vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS store_product_fts")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("store", "0008_alter_colourinventory_colour_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+                model_name="product",
+                name="search_vector",
+                field=django.contrib.postgres.search.SearchVectorField(
+                        editable=False, null=True
+                ),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
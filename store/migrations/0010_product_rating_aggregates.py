@@ -0,0 +1,40 @@
+# Generated by Django 4.1.9 on 2026-10-17 07:31
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def populate_rating_aggregates(apps, schema_editor):
+    Product = apps.get_model("store", "Product")
+    ProductReview = apps.get_model("store", "ProductReview")
+    db_alias = schema_editor.connection.alias
+
+    aggregates = ProductReview.objects.using(db_alias) \
+        .filter(ratings__isnull=False) \
+        .order_by() \
+        .values("product") \
+        .annotate(count=Count("pk"), total=Sum("ratings"))
+    for aggregate in aggregates:
+        Product.objects.using(db_alias).filter(pk=aggregate["product"]).update(
+                rating_count=aggregate["count"], rating_sum=aggregate["total"]
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("store", "0009_product_search_vector"),
+    ]
+
+    operations = [
+        migrations.AddField(
+                model_name="product",
+                name="rating_count",
+                field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+                model_name="product",
+                name="rating_sum",
+                field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.1.9 on 2026-10-17 07:40
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def populate_effective_price(apps, schema_editor):
+    Product = apps.get_model("store", "Product")
+    db_alias = schema_editor.connection.alias
+
+    products = []
+    for product in Product.objects.using(db_alias).only("id", "price", "percentage_off").iterator(chunk_size=1000):
+        # Same computation as Product.discount_price
+        if product.percentage_off > 0:
+            discount = product.price - (product.price * product.percentage_off / 100)
+            product.effective_price = round(Decimal(discount), 2)
+        else:
+            product.effective_price = product.price
+        products.append(product)
+    Product.objects.using(db_alias).bulk_update(products, ["effective_price"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("store", "0010_product_rating_aggregates"),
+    ]
+
+    operations = [
+        migrations.AddField(
+                model_name="product",
+                name="effective_price",
+                field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=6),
+        ),
+        migrations.AddIndex(
+                model_name="product",
+                index=models.Index(fields=["effective_price", "id"], name="store_product_eff_price_idx"),
+        ),
+        migrations.RunPython(populate_effective_price, migrations.RunPython.noop),
+    ]
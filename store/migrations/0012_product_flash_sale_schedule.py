@@ -0,0 +1,39 @@
+# Generated by Django 4.1.9 on 2026-10-17 08:14
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def populate_is_on_flash_sale(apps, schema_editor):
+    Product = apps.get_model("store", "Product")
+    now = timezone.now()
+    Product.objects.using(schema_editor.connection.alias) \
+        .filter(flash_sale_start_date__lte=now, flash_sale_end_date__gte=now) \
+        .update(is_on_flash_sale=True)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("store", "0011_product_effective_price"),
+    ]
+
+    operations = [
+        migrations.AddField(
+                model_name="product",
+                name="is_on_flash_sale",
+                field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddIndex(
+                model_name="product",
+                index=models.Index(fields=["is_on_flash_sale", "-created"], name="store_product_flash_sale_idx"),
+        ),
+        migrations.AddIndex(
+                model_name="product",
+                index=models.Index(fields=["flash_sale_start_date"], name="store_product_fs_start_idx"),
+        ),
+        migrations.AddIndex(
+                model_name="product",
+                index=models.Index(fields=["flash_sale_end_date"], name="store_product_fs_end_idx"),
+        ),
+        migrations.RunPython(populate_is_on_flash_sale, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 4.1.9 on 2026-10-17 08:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("store", "0012_product_flash_sale_schedule"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+                model_name="product",
+                index=models.Index(fields=["updated"], name="store_product_updated_idx"),
+        ),
+    ]
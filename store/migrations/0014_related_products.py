@@ -0,0 +1,56 @@
+# Generated by Django 4.1.9 on 2026-10-17 08:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+RELATED_PRODUCTS_LIMIT = 10
+
+
+def populate_related_products(apps, schema_editor):
+    # Same ranking as store.related.rank_category, newest products in stock first
+    Product = apps.get_model("store", "Product")
+    RelatedProducts = apps.get_model("store", "RelatedProducts")
+    db_alias = schema_editor.connection.alias
+
+    rows = []
+    for category_id in Product.objects.using(db_alias).values_list("category_id", flat=True).distinct():
+        ranked = [str(pk) for pk in Product.objects.using(db_alias)
+                  .filter(category_id=category_id, inventory__gt=0)
+                  .order_by("-created", "-id").values_list("pk", flat=True)[:RELATED_PRODUCTS_LIMIT + 1]]
+        for pk in Product.objects.using(db_alias).filter(category_id=category_id).values_list("pk", flat=True):
+            related_ids = [other for other in ranked if other != str(pk)][:RELATED_PRODUCTS_LIMIT]
+            rows.append(RelatedProducts(product_id=pk, related_ids=related_ids))
+    RelatedProducts.objects.using(db_alias).bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("store", "0013_product_updated_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+                name="RelatedProducts",
+                fields=[
+                    (
+                        "product",
+                        models.OneToOneField(
+                                on_delete=django.db.models.deletion.CASCADE,
+                                primary_key=True,
+                                related_name="related",
+                                serialize=False,
+                                to="store.product",
+                        ),
+                    ),
+                    ("related_ids", models.JSONField(default=list)),
+                ],
+                options={
+                    "verbose_name_plural": "Related Products",
+                },
+        ),
+        migrations.AddIndex(
+                model_name="product",
+                index=models.Index(fields=["category", "-created"], name="store_product_category_idx"),
+        ),
+        migrations.RunPython(populate_related_products, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 4.1.9 on 2026-10-17 08:27
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_ratings_histogram(apps, schema_editor):
+    Product = apps.get_model("store", "Product")
+    ProductReview = apps.get_model("store", "ProductReview")
+    db_alias = schema_editor.connection.alias
+
+    aggregates = ProductReview.objects.using(db_alias) \
+        .filter(ratings__isnull=False) \
+        .order_by() \
+        .values("product", "ratings") \
+        .annotate(count=Count("pk"))
+    for aggregate in aggregates:
+        Product.objects.using(db_alias).filter(pk=aggregate["product"]).update(
+                **{f"rating_{aggregate['ratings']}_count": aggregate["count"]}
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("store", "0014_related_products"),
+    ]
+
+    operations = [
+        migrations.AddField(
+                model_name="product",
+                name="rating_1_count",
+                field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+                model_name="product",
+                name="rating_2_count",
+                field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+                model_name="product",
+                name="rating_3_count",
+                field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+                model_name="product",
+                name="rating_4_count",
+                field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+                model_name="product",
+                name="rating_5_count",
+                field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+                model_name="productreview",
+                index=models.Index(fields=["product", "-created", "-id"], name="store_review_product_idx"),
+        ),
+        migrations.AddIndex(
+                model_name="productreview",
+                index=models.Index(fields=["product", "ratings", "-created", "-id"], name="store_review_rating_idx"),
+        ),
+        migrations.RunPython(populate_ratings_histogram, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.1.9 on 2026-10-17 07:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("store", "0015_product_ratings_histogram"),
+    ]
+
+    operations = [
+        migrations.AddField(
+                model_name="productimage",
+                name="image_urls",
+                field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+                model_name="productreviewimage",
+                name="image_urls",
+                field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+                model_name="sliderimage",
+                name="image_urls",
+                field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
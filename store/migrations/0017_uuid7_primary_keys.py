@@ -0,0 +1,114 @@
+# Generated by Django 4.1.9 on 2026-10-17 07:46
+
+import common.uuids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("store", "0016_image_urls"),
+    ]
+
+    operations = [
+        # The default is only used in Python, the columns themselves do not change
+        migrations.SeparateDatabaseAndState(
+                state_operations=[
+                        migrations.AlterField(
+                                model_name="address",
+                                name="id",
+                                field=models.UUIDField(
+                                        default=common.uuids.uuid7, editable=False, primary_key=True, serialize=False,
+                                        unique=True
+                                ),
+                        ),
+                        migrations.AlterField(
+                                model_name="category",
+                                name="id",
+                                field=models.UUIDField(
+                                        default=common.uuids.uuid7, editable=False, primary_key=True, serialize=False,
+                                        unique=True
+                                ),
+                        ),
+                        migrations.AlterField(
+                                model_name="colour",
+                                name="id",
+                                field=models.UUIDField(
+                                        default=common.uuids.uuid7, editable=False, primary_key=True, serialize=False,
+                                        unique=True
+                                ),
+                        ),
+                        migrations.AlterField(
+                                model_name="couponcode",
+                                name="id",
+                                field=models.UUIDField(
+                                        default=common.uuids.uuid7, editable=False, primary_key=True, serialize=False,
+                                        unique=True
+                                ),
+                        ),
+                        migrations.AlterField(
+                                model_name="favoriteproduct",
+                                name="id",
+                                field=models.UUIDField(
+                                        default=common.uuids.uuid7, editable=False, primary_key=True, serialize=False,
+                                        unique=True
+                                ),
+                        ),
+                        migrations.AlterField(
+                                model_name="notification",
+                                name="id",
+                                field=models.UUIDField(
+                                        default=common.uuids.uuid7, editable=False, primary_key=True, serialize=False,
+                                        unique=True
+                                ),
+                        ),
+                        migrations.AlterField(
+                                model_name="order",
+                                name="id",
+                                field=models.UUIDField(
+                                        default=common.uuids.uuid7, editable=False, primary_key=True, serialize=False,
+                                        unique=True
+                                ),
+                        ),
+                        migrations.AlterField(
+                                model_name="orderitem",
+                                name="id",
+                                field=models.UUIDField(
+                                        default=common.uuids.uuid7, editable=False, primary_key=True, serialize=False,
+                                        unique=True
+                                ),
+                        ),
+                        migrations.AlterField(
+                                model_name="product",
+                                name="id",
+                                field=models.UUIDField(
+                                        default=common.uuids.uuid7, editable=False, primary_key=True, serialize=False,
+                                        unique=True
+                                ),
+                        ),
+                        migrations.AlterField(
+                                model_name="productreview",
+                                name="id",
+                                field=models.UUIDField(
+                                        default=common.uuids.uuid7, editable=False, primary_key=True, serialize=False,
+                                        unique=True
+                                ),
+                        ),
+                        migrations.AlterField(
+                                model_name="size",
+                                name="id",
+                                field=models.UUIDField(
+                                        default=common.uuids.uuid7, editable=False, primary_key=True, serialize=False,
+                                        unique=True
+                                ),
+                        ),
+                        migrations.AlterField(
+                                model_name="sliderimage",
+                                name="id",
+                                field=models.UUIDField(
+                                        default=common.uuids.uuid7, editable=False, primary_key=True, serialize=False,
+                                        unique=True
+                                ),
+                        ),
+                ],
+        ),
+    ]
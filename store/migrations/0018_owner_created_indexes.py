@@ -0,0 +1,40 @@
+# Generated by Django 4.1.9 on 2026-10-17 07:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("store", "0017_uuid7_primary_keys"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+                name="address",
+                options={"ordering": ("-created",), "verbose_name_plural": "Addresses"},
+        ),
+        migrations.AlterModelOptions(
+                name="favoriteproduct",
+                options={"ordering": ("-created",)},
+        ),
+        migrations.AddIndex(
+                model_name="address",
+                index=models.Index(fields=["customer", "-created"], name="store_address_customer_idx"),
+        ),
+        migrations.AddIndex(
+                model_name="favoriteproduct",
+                index=models.Index(fields=["customer", "-created"], name="store_fav_customer_idx"),
+        ),
+        migrations.AddIndex(
+                model_name="notification",
+                index=models.Index(fields=["-created"], name="store_notif_created_idx"),
+        ),
+        migrations.AddIndex(
+                model_name="order",
+                index=models.Index(fields=["customer", "-created"], name="store_order_customer_idx"),
+        ),
+        migrations.AddIndex(
+                model_name="orderitem",
+                index=models.Index(fields=["order", "-created"], name="store_orderitem_order_idx"),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.1.9 on 2026-10-17 08:14
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def populate_price_snapshot(apps, schema_editor):
+    OrderItem = apps.get_model("store", "OrderItem")
+    db_alias = schema_editor.connection.alias
+
+    items = []
+    for item in OrderItem.objects.using(db_alias).select_related("product").iterator(chunk_size=1000):
+        product = item.product
+        # Same computations as Product.discount_price and OrderItem.calculate_line_total
+        if product.percentage_off > 0:
+            discount = product.price - (product.price * product.percentage_off / 100)
+            discount_price = round(Decimal(discount), 2)
+        else:
+            discount_price = Decimal(0)
+        item.unit_price = product.price
+        item.discount_price = discount_price
+        item.shipping_fee = product.shipping_fee
+        extra_price = item.extra_price or 0
+        if discount_price > 0:
+            item.line_total = item.quantity * (discount_price + extra_price) + product.shipping_fee
+        else:
+            item.line_total = item.quantity * (product.price + product.shipping_fee + extra_price) + product.shipping_fee
+        items.append(item)
+    OrderItem.objects.using(db_alias).bulk_update(
+            items, ["unit_price", "discount_price", "shipping_fee", "line_total"], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("store", "0018_owner_created_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+                model_name="orderitem",
+                name="discount_price",
+                field=models.DecimalField(decimal_places=2, editable=False, max_digits=6, null=True),
+        ),
+        migrations.AddField(
+                model_name="orderitem",
+                name="line_total",
+                field=models.DecimalField(decimal_places=2, editable=False, max_digits=12, null=True),
+        ),
+        migrations.AddField(
+                model_name="orderitem",
+                name="shipping_fee",
+                field=models.DecimalField(decimal_places=2, editable=False, max_digits=6, null=True),
+        ),
+        migrations.AddField(
+                model_name="orderitem",
+                name="unit_price",
+                field=models.DecimalField(decimal_places=2, editable=False, max_digits=6, null=True),
+        ),
+        migrations.RunPython(populate_price_snapshot, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.1.9 on 2026-10-17 09:02
+
+from django.db import migrations
+
+
+def key_search_index_on_product_id(apps, schema_editor):
+    # The implicit rowid of store_product is renumbered by VACUUM and table rebuilds, the product id is not
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS store_product_fts")
+    schema_editor.execute(
+            "CREATE VIRTUAL TABLE store_product_fts USING fts5("
+            "product_id UNINDEXED, title, description, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    schema_editor.execute(
+            "INSERT INTO store_product_fts (product_id, title, description) "
+            "SELECT id, title, description FROM store_product"
+    )
+
+
+def key_search_index_on_rowid(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS store_product_fts")
+    schema_editor.execute(
+            "CREATE VIRTUAL TABLE store_product_fts USING fts5("
+            "title, description, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    schema_editor.execute(
+            "INSERT INTO store_product_fts (rowid, title, description) "
+            "SELECT rowid, title, description FROM store_product"
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("store", "0019_order_item_price_snapshot"),
+    ]
+
+    operations = [
+        migrations.RunPython(key_search_index_on_product_id, key_search_index_on_rowid),
+    ]
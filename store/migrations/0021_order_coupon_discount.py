@@ -0,0 +1,17 @@
+# Generated by Django 4.1.9 on 2026-10-17 09:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("store", "0020_product_fts_product_id"),
+    ]
+
+    operations = [
+        migrations.AddField(
+                model_name="order",
+                name="coupon_discount",
+                field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=6),
+        ),
+    ]
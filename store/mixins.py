@@ -11,7 +11,7 @@ class GetOrderByTransactionRefMixin:
     def _get_order_by_transaction_ref(transaction_reference, request):
         customer = request.user
         try:
-            order = Order.objects.get(customer=customer, transaction_ref=transaction_reference)
+            order = Order.objects.with_totals().get(customer=customer, transaction_ref=transaction_reference)
         except Order.DoesNotExist:
             return None
         return order
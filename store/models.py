@@ -5,11 +5,10 @@ from autoslug import AutoSlugField
 from dateutil.relativedelta import relativedelta
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
-from django.db.models import Avg
 from django.utils import timezone
-from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 from django_countries.fields import CountryField
 from rest_framework.exceptions import ValidationError
@@ -55,6 +54,26 @@ class Colour(BaseModel):
         return f"{self.name} ---- {self.hex_code}"
 
 
+def rating_count_field(stars):
+    return f"rating_{stars}_count"
+
+
+def calculate_discount_price(price, percentage_off):
+    # Check if a percentage discount is applicable
+    if percentage_off > 0:
+        # Calculate the discounted price based on the percentage off
+        discount = price - (price * percentage_off / 100)
+        return round(Decimal(discount), 2)
+    return 0
+
+
+def calculate_line_total(quantity, unit_price, discount_price, shipping_fee, extra_price):
+    extra_price = extra_price or 0
+    if float(discount_price) > 0:
+        return (quantity * (discount_price + extra_price)) + shipping_fee
+    return (quantity * (unit_price + shipping_fee + extra_price)) + shipping_fee
+
+
 class Product(BaseModel):
     title = models.CharField(max_length=255, unique=True)
     slug = AutoSlugField(populate_from="title", unique=True, always_update=True, editable=False)
@@ -78,27 +97,74 @@ class Product(BaseModel):
     location = CountryField(help_text=_("Select the product's location"))
     flash_sale_start_date = models.DateTimeField(null=True, blank=True)
     flash_sale_end_date = models.DateTimeField(null=True, blank=True)
+    # Whether now is inside the flash sale window, flipped at the window boundaries by store.flash_sales
+    is_on_flash_sale = models.BooleanField(default=False, editable=False)
+    # What customers pay, kept in sync with price and percentage_off on save so it can be filtered and sorted on
+    effective_price = models.DecimalField(max_digits=6, decimal_places=2, default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    # Number of reviews per star, kept up to date along with rating_count
+    rating_1_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_2_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_3_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_4_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_5_count = models.PositiveIntegerField(default=0, editable=False)
+    # Maintained by the search backend, only populated on PostgreSQL
+    search_vector = SearchVectorField(null=True, editable=False)
 
     objects = ProductManager()
 
+    class Meta(BaseModel.Meta):
+        indexes = [
+            models.Index(fields=["effective_price", "id"], name="store_product_eff_price_idx"),
+            models.Index(fields=["is_on_flash_sale", "-created"], name="store_product_flash_sale_idx"),
+            models.Index(fields=["flash_sale_start_date"], name="store_product_fs_start_idx"),
+            models.Index(fields=["flash_sale_end_date"], name="store_product_fs_end_idx"),
+            models.Index(fields=["updated"], name="store_product_updated_idx"),
+            models.Index(fields=["category", "-created"], name="store_product_category_idx"),
+        ]
+
     def __str__(self):
         return f"{self.title} --- {self.category}"
 
-    @cached_property
+    def save(self, *args, **kwargs):
+        self.update_effective_price()
+        self.update_flash_sale_status()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if {"price", "percentage_off"} & update_fields:
+                update_fields.add("effective_price")
+            if {"flash_sale_start_date", "flash_sale_end_date"} & update_fields:
+                update_fields.add("is_on_flash_sale")
+            kwargs["update_fields"] = update_fields
+        super().save(*args, **kwargs)
+
+    def update_effective_price(self):
+        self.effective_price = self.discount_price or self.price
+
+    def update_flash_sale_status(self, now=None):
+        now = now or timezone.now()
+        self.is_on_flash_sale = bool(
+                self.flash_sale_start_date and self.flash_sale_end_date
+                and self.flash_sale_start_date <= now < self.flash_sale_end_date
+        )
+
+    @property
     def average_ratings(self):
-        # Calculate the average ratings for the product
-        result = self.product_reviews.aggregate(Avg("ratings"))
-        # Return the average ratings or 0 if no ratings are available
-        return result["ratings__avg"] or 0
+        # rating_count and rating_sum are kept up to date by the product review signals
+        if self.rating_count:
+            return self.rating_sum / self.rating_count
+        # Return 0 if no ratings are available
+        return 0
 
     @property
     def discount_price(self):
-        # Check if a percentage discount is applicable
-        if self.percentage_off > 0:
-            # Calculate the discounted price based on the percentage off
-            discount = self.price - (self.price * self.percentage_off / 100)
-            return round(Decimal(discount), 2)
-        return 0
+        return calculate_discount_price(self.price, self.percentage_off)
+
+    @property
+    def ratings_histogram(self):
+        return {str(stars): getattr(self, rating_count_field(stars)) for stars, _ in RATING_CHOICES}
 
 
 class ColourInventory(models.Model):
@@ -144,16 +210,38 @@ class SizeInventory(models.Model):
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="images")
     _image = models.ImageField(upload_to='store/product_images', validators=[validate_image_size])
+    # URLs of the original and its resized variants, filled in by common.images
+    image_urls = models.JSONField(default=dict, blank=True, editable=False)
 
     def __str__(self):
         return self.product.title
 
     @property
     def image(self):
+        if self.image_urls:
+            return self.image_urls["original"]
         if self._image is not None:
             return self._image.url
         return None
 
+    @property
+    def urls(self):
+        return self.image_urls or {"original": self.image}
+
+
+class RelatedProducts(models.Model):
+    """
+    Ids of the products shown next to a product, ranked. Rebuilt per category by store.related.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name="related")
+    related_ids = models.JSONField(default=list)
+
+    class Meta:
+        verbose_name_plural = _("Related Products")
+
+    def __str__(self):
+        return self.product.title
+
 
 class FavoriteProduct(BaseModel):
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name="favorite_products")
@@ -161,12 +249,15 @@ class FavoriteProduct(BaseModel):
 
     objects = FavoriteProductManager()
 
-    class Meta:
+    class Meta(BaseModel.Meta):
         constraints = [
             models.UniqueConstraint(
                     fields=["customer", "product"], name="unique_customer_product"
             )
         ]
+        indexes = [
+            models.Index(fields=["customer", "-created"], name="store_fav_customer_idx"),
+        ]
 
     def __str__(self):
         return f"{self.customer.full_name} ----- {self.product.title}"
@@ -177,9 +268,13 @@ class SliderImage(BaseModel):
             upload_to='store/slider_images/', validators=[validate_image_size],
             help_text=_("Image for the slider")
     )
+    # URLs of the original and its resized variants, filled in by common.images
+    image_urls = models.JSONField(default=dict, blank=True, editable=False)
 
     @property
     def slider_image(self):
+        if self.image_urls:
+            return self.image_urls["original"]
         if self._image is not None:
             return self._image.url
         return None
@@ -193,6 +288,12 @@ class ProductReview(BaseModel):
 
     objects = ProductReviewManager()
 
+    class Meta(BaseModel.Meta):
+        indexes = [
+            models.Index(fields=["product", "-created", "-id"], name="store_review_product_idx"),
+            models.Index(fields=["product", "ratings", "-created", "-id"], name="store_review_rating_idx"),
+        ]
+
     def __str__(self):
         return f"{self.customer.full_name} --- {self.product.title} --- {self.ratings} stars"
 
@@ -202,9 +303,13 @@ class ProductReviewImage(models.Model):
             ProductReview, on_delete=models.CASCADE, related_name="images"
     )
     _image = models.ImageField(upload_to='store/review_images', validators=[validate_image_size])
+    # URLs of the original and its resized variants, filled in by common.images
+    image_urls = models.JSONField(default=dict, blank=True, editable=False)
 
     @property
     def review_image(self):
+        if self.image_urls:
+            return self.image_urls["original"]
         if self._image is not None:
             return self._image.url
         return None
@@ -219,6 +324,12 @@ class Notification(BaseModel):
             default=False, help_text=_("Whether the notification is general or specific to individual customers.")
     )
 
+    class Meta(BaseModel.Meta):
+        indexes = [
+            # Staff list every notification, newest first
+            models.Index(fields=["-created"], name="store_notif_created_idx"),
+        ]
+
     def __str__(self):
         return f"{self.notification_type} ---- {self.title}"
 
@@ -258,20 +369,40 @@ class Order(BaseModel):
     shipping_status = models.CharField(
             max_length=2, choices=SHIPPING_STATUS_CHOICES, default=SHIPPING_STATUS_PENDING
     )
+    # Price of the coupon redeemed at checkout, taken off the total of the lines
+    coupon_discount = models.DecimalField(max_digits=6, decimal_places=2, default=0, editable=False)
 
     objects = OrderManager()
 
+    class Meta(BaseModel.Meta):
+        indexes = [
+            # A customer's orders, newest first
+            models.Index(fields=["customer", "-created"], name="store_order_customer_idx"),
+        ]
+
     @property
     def all_total_price(self):
-        cart_total = sum([item.total_price for item in self.order_items.all()])
-        return cart_total
+        if hasattr(self, "order_total"):
+            # Annotated by `Order.objects.with_totals()`
+            cart_total = self.order_total
+        else:
+            cart_total = sum([item.total_price for item in self.order_items.all()])
+        return max(cart_total - self.coupon_discount, 0)
 
     @property
     def total_items(self):
+        if hasattr(self, "order_quantity"):
+            return self.order_quantity
         order_items = self.order_items.all()
         total = sum([item.quantity for item in order_items])
         return total
 
+    @property
+    def items_count(self):
+        if hasattr(self, "order_item_count"):
+            return self.order_item_count
+        return self.order_items.count()
+
     @property
     def estimated_shipping_date(self):
         # adding on month to the date the order was placed
@@ -282,6 +413,8 @@ class Order(BaseModel):
 
 
 class OrderItem(BaseModel):
+    price_fields = ("unit_price", "discount_price", "shipping_fee")
+
     customer = models.ForeignKey(
             Customer, on_delete=models.CASCADE, related_name="order_items", null=True
     )
@@ -292,21 +425,53 @@ class OrderItem(BaseModel):
     size = models.CharField(max_length=20, null=True)
     colour = models.CharField(max_length=20, null=True)
     ordered = models.BooleanField(default=False)
+    # Prices of the product when the line was added or checked out
+    unit_price = models.DecimalField(max_digits=6, decimal_places=2, null=True, editable=False)
+    discount_price = models.DecimalField(max_digits=6, decimal_places=2, null=True, editable=False)
+    shipping_fee = models.DecimalField(max_digits=6, decimal_places=2, null=True, editable=False)
+    line_total = models.DecimalField(max_digits=12, decimal_places=2, null=True, editable=False)
 
     objects = OrderItemManager()
 
+    class Meta(BaseModel.Meta):
+        indexes = [
+            models.Index(fields=["order", "-created"], name="store_orderitem_order_idx"),
+        ]
+
     def __str__(self):
         return (
             f"{self.order.transaction_ref} --- {self.product.title} --- {self.quantity}"
         )
 
+    def save(self, *args, **kwargs):
+        if self.unit_price is None:
+            self.capture_prices()
+        self.line_total = self.calculate_line_total()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "line_total"}
+        super().save(*args, **kwargs)
+
+    def capture_prices(self, product=None):
+        # The line keeps the prices it was added or checked out with, later catalog edits do not change its total
+        product = product or self.product
+        prices = {"unit_price": product.price, "discount_price": product.discount_price,
+                  "shipping_fee": product.shipping_fee}
+        for name, value in prices.items():
+            setattr(self, name, self._meta.get_field(name).to_python(value))
+
+    def calculate_line_total(self):
+        return calculate_line_total(self.quantity, self.unit_price, self.discount_price, self.shipping_fee,
+                                    self.extra_price)
+
     @property
     def total_price(self):
-        extra_price = self.extra_price
-        if float(self.product.discount_price) > 0:
-            return (self.quantity * (self.product.discount_price + extra_price)) + self.product.shipping_fee
-        return (self.quantity * (
-                self.product.price + self.product.shipping_fee + extra_price)) + self.product.shipping_fee
+        if hasattr(self, "order_item_total"):
+            # Annotated by `OrderItem.objects.with_totals()`
+            return self.order_item_total
+        if self.line_total is None:
+            return self.calculate_line_total()
+        return self.line_total
 
 
 class Address(BaseModel):
@@ -323,5 +488,8 @@ class Address(BaseModel):
 
     objects = AddressManager()
 
-    class Meta:
+    class Meta(BaseModel.Meta):
         verbose_name_plural = _("Addresses")
+        indexes = [
+            models.Index(fields=["customer", "-created"], name="store_address_customer_idx"),
+        ]
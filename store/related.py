@@ -0,0 +1,81 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from store.cache import bump_cache_version, versioned_cache_key
+from store.fast_serializers import product_list_serializer
+from store.models import Product, RelatedProducts
+
+RELATED_PRODUCTS_LIMIT = 10
+
+
+def _namespace(category_id):
+    return f"related_products:{category_id}"
+
+
+def rank_category(category_id, using="default"):
+    # Newest products in stock first, one more than the limit so every product can leave itself out
+    return [str(pk) for pk in Product.objects.using(using).filter(category_id=category_id)
+            .order_by("-created", "-id").values_list("pk", flat=True)[:RELATED_PRODUCTS_LIMIT + 1]]
+
+
+def rebuild_related_products(category_ids, using="default"):
+    """
+    Recomputes the related products of every product in the given categories.
+
+    Only the top ranked products get their own list, all the others share the top of the ranking, so a category
+    costs one ranking query and a few reads whatever its size. Only the rows whose list changed are written, a
+    product save that leaves the ranking as it was writes nothing.
+    """
+    rows = RelatedProducts.objects.using(using)
+    for category_id in set(category_ids) - {None}:
+        ranked = rank_category(category_id, using)
+        top = ranked[:RELATED_PRODUCTS_LIMIT]
+
+        rows.filter(product__category_id=category_id).exclude(product_id__in=ranked).exclude(related_ids=top) \
+            .update(related_ids=top)
+        missing = Product._base_manager.using(using) \
+            .filter(category_id=category_id, related__isnull=True) \
+            .exclude(pk__in=ranked) \
+            .values_list("pk", flat=True)
+        # Concurrent rebuilds of the category may add the same rows
+        rows.bulk_create([RelatedProducts(product_id=pk, related_ids=top) for pk in missing], batch_size=1000,
+                         ignore_conflicts=True)
+        current = {str(pk): related_ids for pk, related_ids in
+                   rows.filter(product_id__in=ranked).values_list("product_id", "related_ids")}
+        ranked_rows = [
+            RelatedProducts(product_id=pk, related_ids=[other for other in ranked if other != pk][:len(top)])
+            for pk in ranked
+        ]
+        changed = [row for row in ranked_rows if current.get(row.product_id) != row.related_ids]
+        if changed:
+            rows.bulk_create(changed, update_conflicts=True, unique_fields=["product"], update_fields=["related_ids"])
+        invalidate_related_products(category_id)
+
+
+def invalidate_related_products(category_id):
+    # Drops the cached payloads, e.g. after a product of the category changed without moving in the ranking
+    bump_cache_version(_namespace(category_id))
+
+
+def get_related_products(product, using="default"):
+    """
+    The serialized related products of a product, read from the ranking table and the per category payload cache.
+    Products without a row yet, e.g. before `rebuild_related_products` runs, get the top of the category ranking.
+    """
+    related_ids = RelatedProducts.objects.using(using).filter(product_id=product.pk) \
+        .values_list("related_ids", flat=True).first()
+    if related_ids is None:
+        related_ids = [pk for pk in rank_category(product.category_id, using) if pk != str(product.pk)]
+        related_ids = related_ids[:RELATED_PRODUCTS_LIMIT]
+
+    key = versioned_cache_key(_namespace(product.category_id))
+    payloads = cache.get(key) or {}
+    missing = [pk for pk in related_ids if pk not in payloads]
+    if missing:
+        # Products sold out since the last rebuild are cached as None
+        payloads.update(dict.fromkeys(missing))
+        queryset = Product.objects.using(using).for_listing().filter(pk__in=missing)
+        for item in product_list_serializer.serialize(queryset):
+            payloads[item["id"]] = item
+        cache.set(key, payloads, settings.RELATED_PRODUCTS_CACHE_TIMEOUT)
+    return [payloads[pk] for pk in related_ids if payloads[pk] is not None]
@@ -0,0 +1,151 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+
+from store.models import Product
+
+SEARCH_FIELDS = ("title", "description")
+
+# Longer queries are truncated instead of building huge match expressions
+MAX_SEARCH_TERMS = 10
+
+
+def get_search_terms(query):
+    return re.findall(r"\w+", query.lower())[:MAX_SEARCH_TERMS]
+
+
+class BasicSearchBackend:
+    """
+    Fallback for databases without full-text support, matches every term with `icontains`.
+    """
+    rank_field = "search_rank"
+
+    def search(self, queryset, query, fields=SEARCH_FIELDS, rank=True):
+        terms = get_search_terms(query)
+        if not terms:
+            return queryset.none()
+        for term in terms:
+            condition = Q()
+            for field in fields:
+                condition |= Q(**{f"{field}__icontains": term})
+            queryset = queryset.filter(condition)
+        if rank:
+            queryset = queryset.annotate(**{self.rank_field: Value(0.0, output_field=FloatField())})
+        return queryset
+
+    def index_products(self, product_ids, using="default"):
+        pass
+
+    def remove_products(self, product_ids, using="default"):
+        pass
+
+    def rebuild(self, using="default"):
+        pass
+
+
+class PostgresSearchBackend(BasicSearchBackend):
+    """
+    Full-text search on the GIN indexed `Product.search_vector` column, title matches weigh more than descriptions.
+    """
+    config = "english"
+    weights = {"title": "A", "description": "B"}
+
+    def search(self, queryset, query, fields=SEARCH_FIELDS, rank=True):
+        terms = get_search_terms(query)
+        if not terms:
+            return queryset.none()
+        # `term:*AB` is a prefix match restricted to the lexemes stored with the given weights
+        weights = "" if set(fields) == set(SEARCH_FIELDS) else "".join(self.weights[field] for field in fields)
+        search_query = SearchQuery(
+                " & ".join(f"{term}:*{weights}" for term in terms), config=self.config, search_type="raw"
+        )
+        queryset = queryset.filter(search_vector=search_query)
+        if rank:
+            # float8 so the value round-trips exactly through pagination cursors
+            queryset = queryset.annotate(
+                    **{self.rank_field: Cast(SearchRank(F("search_vector"), search_query), FloatField())}
+            )
+        return queryset
+
+    def get_search_vector(self):
+        return SearchVector("title", weight=self.weights["title"], config=self.config) + \
+            SearchVector("description", weight=self.weights["description"], config=self.config)
+
+    def index_products(self, product_ids, using="default"):
+        Product._base_manager.using(using).filter(pk__in=product_ids) \
+            .update(search_vector=self.get_search_vector())
+
+    def rebuild(self, using="default"):
+        Product._base_manager.using(using).update(search_vector=self.get_search_vector())
+
+
+class SqliteSearchBackend(BasicSearchBackend):
+    """
+    Full-text search on an FTS5 table keyed on the product id, used for local development.
+    """
+    table = "store_product_fts"
+    # bm25 column weights, in the order the columns are declared on the FTS5 table, the product id is not indexed
+    column_weights = (0.0, 10.0, 1.0)
+
+    def search(self, queryset, query, fields=SEARCH_FIELDS, rank=True):
+        terms = get_search_terms(query)
+        if not terms:
+            return queryset.none()
+        match = "{%s} : %s" % (" ".join(fields), " ".join(f'"{term}"*' for term in terms))
+        product_table = Product._meta.db_table
+
+        queryset = queryset.filter(pk__in=RawSQL(
+                f"SELECT product_id FROM {self.table} WHERE {self.table} MATCH %s", (match,)
+        ))
+        if rank:
+            weights = ", ".join(str(weight) for weight in self.column_weights)
+            queryset = queryset.annotate(**{self.rank_field: RawSQL(
+                    f"SELECT -bm25({self.table}, {weights}) FROM {self.table} "
+                    f"WHERE {self.table} MATCH %s AND product_id = {product_table}.id",
+                    (match,), output_field=FloatField()
+            )})
+        return queryset
+
+    def index_products(self, product_ids, using="default"):
+        product_table = Product._meta.db_table
+        subquery, params = self._product_ids_subquery(product_ids, using)
+        with connections[using].cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE product_id IN ({subquery})", params)
+            cursor.execute(
+                    f"INSERT INTO {self.table} (product_id, title, description) "
+                    f"SELECT id, title, description FROM {product_table} WHERE id IN ({subquery})", params
+            )
+
+    def remove_products(self, product_ids, using="default"):
+        # Runs before the products are deleted, their ids are read in the column format from the product table
+        subquery, params = self._product_ids_subquery(product_ids, using)
+        with connections[using].cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE product_id IN ({subquery})", params)
+
+    def rebuild(self, using="default"):
+        product_table = Product._meta.db_table
+        with connections[using].cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+            cursor.execute(
+                    f"INSERT INTO {self.table} (product_id, title, description) "
+                    f"SELECT id, title, description FROM {product_table}"
+            )
+
+    @staticmethod
+    def _product_ids_subquery(product_ids, using):
+        queryset = Product._base_manager.using(using).filter(pk__in=product_ids).values("pk")
+        return queryset.query.sql_with_params()
+
+
+SEARCH_BACKENDS = {
+    "postgresql": PostgresSearchBackend(),
+    "sqlite": SqliteSearchBackend(),
+}
+
+
+def get_search_backend(using="default"):
+    return SEARCH_BACKENDS.get(connections[using].vendor, BasicSearchBackend())
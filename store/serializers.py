@@ -1,15 +1,15 @@
 import uuid
 from datetime import timedelta
 
-from django.db import transaction
-from django.shortcuts import get_object_or_404
+from django.conf import settings
 from django_countries.fields import CountryField
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
+from store.carts import CartBatch, CartItemMutation, build_cart_item, checkout_cart, get_cart_backend, \
+    get_customer_cart, load_cart_product, parse_cart_id
 from store.choices import PAYMENT_STATUS, RATING_CHOICES, SHIPPING_STATUS_CHOICES
-from store.models import Address, ColourInventory, CouponCode, Order, OrderItem, Product, \
-    ProductImage, SizeInventory
+from store.models import Address, Order, OrderItem, Product, ProductImage
 
 
 class AddCheckoutOrderAddressSerializer(serializers.Serializer):
@@ -111,6 +111,7 @@ class ProductSerializer(serializers.Serializer):
     percentage_off = serializers.IntegerField()
     discount_price = serializers.DecimalField(max_digits=6, decimal_places=2, default=0)
     images = serializers.SerializerMethodField()
+    image_urls = serializers.SerializerMethodField()
     size_inventory = SizeInventorySerializer(many=True)
     color_inventory = ColourInventorySerializer(many=True)
     shipped_out_days = serializers.IntegerField()
@@ -118,6 +119,10 @@ class ProductSerializer(serializers.Serializer):
     def get_images(self, obj: Product):
         return [image.image for image in obj.images.all()]
 
+    def get_image_urls(self, obj: Product):
+        # Original, thumbnail, medium and large URLs of every image
+        return [image.urls for image in obj.images.all()]
+
 
 class ProductDetailSerializer(ProductSerializer):
     inventory = serializers.IntegerField()
@@ -125,6 +130,7 @@ class ProductDetailSerializer(ProductSerializer):
     shipping_fee = serializers.DecimalField(max_digits=6, decimal_places=2, default=0)
     location = serializers.CharField()
     average_ratings = serializers.DecimalField(max_digits=4, decimal_places=2, default=0)
+    ratings_histogram = serializers.DictField(child=serializers.IntegerField())
 
 
 class FavoriteProductSerializer(serializers.Serializer):
@@ -146,7 +152,7 @@ class AddProductReviewSerializer(serializers.Serializer):
     )
 
     def validate_product_id(self, value):
-        if not Product.objects.filter(id=value).exists():
+        if not Product.objects.exists_only().filter(id=value).exists():
             raise ValidationError(
                     {
                         "message": "This product does not exist, try again",
@@ -159,9 +165,7 @@ class AddProductReviewSerializer(serializers.Serializer):
 class CartItemSerializer(serializers.Serializer):
     cart_id = serializers.UUIDField(source="order_id")
     product = SimpleProductSerializer()
-    discount_price = serializers.DecimalField(
-            max_digits=6, decimal_places=2, source="product.discount_price"
-    )
+    discount_price = serializers.DecimalField(max_digits=6, decimal_places=2)
     size = serializers.CharField()
     colour = serializers.CharField()
     extra_price = serializers.DecimalField(max_digits=6, decimal_places=2, default=0)
@@ -169,103 +173,22 @@ class CartItemSerializer(serializers.Serializer):
     total_price = serializers.DecimalField(max_digits=6, decimal_places=2, default=0)
 
 
-def validate_cart_item(attrs):
-    product_id = attrs.get("product_id")
-    if not Product.objects.filter(id=product_id).exists():
-        raise ValidationError(
-                {"message": "No product with the given ID was found.", "status": "failed"}
-        )
-
-    product = Product.objects.get(id=product_id)
-
-    size = attrs.get("size")
-    if size and not product.size_inventory.filter(size__title=size).exists():
-        raise ValidationError(
-                {"message": "Size not found for the given product.", "status": "failed"}
-        )
-
-    colour = attrs.get("colour")
-    if colour and not product.color_inventory.filter(colour__name=colour).exists():
-        raise ValidationError(
-                {"message": "Colour not found for the given product.", "status": "failed"}
-        )
-
-    return attrs
-
-
 class AddCartItemSerializer(serializers.Serializer):
     cart_id = serializers.CharField(max_length=60, required=False, default=None, allow_blank=True)
     product_id = serializers.CharField(max_length=100)
     size = serializers.CharField(required=False, allow_blank=True)
     colour = serializers.CharField(required=False, allow_blank=True)
-    quantity = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
 
     def validate(self, attrs):
-        attrs = validate_cart_item(attrs)
+        attrs["mutation"] = CartItemMutation.load(
+                self.context["request"].user, attrs["product_id"], size=attrs.get("size"),
+                colour=attrs.get("colour"), cart_id=attrs.get("cart_id"),
+        )
         return attrs
 
     def save(self, **kwargs):
-        customer = self.context["request"].user
-        product_id = self.validated_data["product_id"]
-        size = self.validated_data.get("size")
-        colour = self.validated_data.get("colour")
-        quantity = self.validated_data["quantity"]
-        cart_id = self.validated_data.get("cart_id", str(uuid.uuid4()))
-
-        product = get_object_or_404(Product, id=product_id)
-        if product.inventory <= 0:
-            raise ValidationError({"message": "This product is out of stock", "status": "failed"})
-        cart, _ = Order.objects.get_or_create(id=cart_id, customer=customer)
-
-        extra_price = 0
-        if size:
-            size_inv = SizeInventory.objects.filter(size__title__iexact=size, product=product).first()
-
-            if not size_inv:
-                raise ValidationError({"message": "Size for this product does not exist", "status": "failed"})
-
-            if size_inv.quantity <= 0:
-                size_inv.quantity = 0
-                raise ValidationError({"message": "Size for this product is out of stock", "status": "failed"})
-
-            extra_price += size_inv.extra_price
-
-        if colour:
-            colour_inv = ColourInventory.objects.filter(colour__name__iexact=colour, product=product).first()
-
-            if not colour_inv:
-                raise ValidationError({"message": "Colour for this product does not exist", "status": "failed"})
-
-            if colour_inv.quantity <= 0:
-                colour_inv.quantity = 0
-                raise ValidationError({"message": "Colour for this product is out of stock", "status": "failed"})
-
-            extra_price += colour_inv.extra_price
-
-        cart_item = cart.order_items.filter(product=product, size=size, colour=colour).first()
-
-        if cart_item:
-            cart_item.quantity = quantity
-            cart_item.extra_price = extra_price
-            cart_item.save()
-        else:
-            cart_item = OrderItem.objects.create(
-                    customer=customer,
-                    order=cart,
-                    product=product,
-                    size=size,
-                    colour=colour,
-                    quantity=quantity,
-                    extra_price=extra_price
-            )
-
-        if cart_item.quantity == 0:
-            cart_item.delete()
-
-        if cart.order_items.count() == 0:
-            cart.delete()
-
-        return cart_item
+        return self.validated_data["mutation"].apply(self.validated_data["quantity"])
 
 
 class UpdateCartItemSerializer(serializers.Serializer):
@@ -274,112 +197,85 @@ class UpdateCartItemSerializer(serializers.Serializer):
     size = serializers.CharField(required=False, allow_blank=True)
     colour = serializers.CharField(required=False, allow_blank=True)
 
-    def validate(self, attrs):
-        attrs = validate_cart_item(attrs)
-        return attrs
-
     def save(self, **kwargs):
         customer = self.context["request"].user
-        cart_id = self.validated_data["cart_id"]
         product_id = self.validated_data["product_id"]
-        size = self.validated_data.get("size", "")
-        colour = self.validated_data.get("colour", "")
-
-        try:
-            cart = Order.objects.get(id=cart_id, customer=customer)
-            product = Product.objects.get(id=product_id)
-            item = OrderItem.objects.get(order=cart, product=product)
-        except Order.DoesNotExist:
-            raise ValidationError({
-                "message": "Invalid cart ID. Please check the provided ID.",
-                "status": "failed",
-            })
-        except Product.DoesNotExist:
-            raise ValidationError({
-                "message": "Invalid product ID. Please check the provided ID.",
-                "status": "failed",
-            })
-        except OrderItem.DoesNotExist:
-            raise ValidationError({
-                "message": "Cart item does not exist. Please add the product to the cart first.",
-                "status": "failed",
-            })
-
-        if size:
-            item.size = size
-
-        if colour:
-            item.colour = colour
-
-        item.extra_price = self.determine_extra_price(item)
-        item.save()
-
+        backend = get_cart_backend()
+        cart_id = parse_cart_id(self.validated_data["cart_id"])
+
+        with backend.lock(cart_id):
+            cart = get_customer_cart(customer, cart_id, backend)
+            if cart is None:
+                raise ValidationError({
+                    "message": "Invalid cart ID. Please check the provided ID.",
+                    "status": "failed",
+                })
+            line = cart.get_product_line(product_id)
+            if line is None:
+                raise ValidationError({
+                    "message": "Cart item does not exist. Please add the product to the cart first.",
+                    "status": "failed",
+                })
+
+            size = self.validated_data.get("size") or line["size"]
+            colour = self.validated_data.get("colour") or line["colour"]
+            product, variant = load_cart_product(product_id, size, colour)
+            variant.check(size, colour, in_stock=False)
+            # The line keeps the prices it was added with
+            item = build_cart_item(cart, product, size, colour, line["quantity"], variant.extra_price(size, colour),
+                                   line)
+
+            cart.remove_line(product_id, line["size"], line["colour"])
+            cart.set_line(item)
+            backend.save(cart)
         return item
 
-    def determine_extra_price(self, cart_item):
-        total_extra_price = 0
-
-        if cart_item.colour:
-            try:
-                colour_obj = ColourInventory.objects.filter(
-                        colour__name__iexact=cart_item.colour,
-                        product=cart_item.product
-                ).first()
-
-                if colour_obj:
-                    total_extra_price += colour_obj.extra_price
 
-            except ColourInventory.MultipleObjectsReturned:
-                # Multiple ColourInventory objects found, select the first one
-                colour_obj = ColourInventory.objects.filter(
-                        colour__name__iexact=cart_item.colour,
-                        product=cart_item.product
-                ).first()
-
-                if colour_obj:
-                    total_extra_price += colour_obj.extra_price
-
-        if cart_item.size:
-            try:
-                size_obj = SizeInventory.objects.filter(
-                        size__title__iexact=cart_item.size,
-                        product=cart_item.product
-                ).first()
+class DeleteCartItemSerializer(serializers.Serializer):
+    cart_id = serializers.CharField(max_length=60, required=True)
+    product_id = serializers.CharField(max_length=100, required=True)
 
-                if size_obj:
-                    total_extra_price += size_obj.extra_price
+    def save(self, **kwargs):
+        customer = self.context["request"].user
+        backend = get_cart_backend()
+        cart_id = parse_cart_id(self.validated_data["cart_id"])
+        with backend.lock(cart_id):
+            cart = get_customer_cart(customer, cart_id, backend)
+            line = cart and cart.get_product_line(self.validated_data["product_id"])
+            if line is None:
+                raise ValidationError(
+                        {
+                            "message": "Invalid cart or product ID. Please check the provided IDs.",
+                            "status": "failed",
+                        }
+                )
+            cart.remove_line(line["product_id"], line["size"], line["colour"])
+            backend.update(cart)
 
-            except SizeInventory.MultipleObjectsReturned:
-                # Multiple SizeInventory objects found, select the first one
-                size_obj = SizeInventory.objects.filter(
-                        size__title__iexact=cart_item.size,
-                        product=cart_item.product
-                ).first()
 
-                if size_obj:
-                    total_extra_price += size_obj.extra_price
+class CartOperationSerializer(serializers.Serializer):
+    op = serializers.ChoiceField(choices=CartBatch.operations)
+    product_id = serializers.UUIDField()
+    size = serializers.CharField(required=False, allow_blank=True)
+    colour = serializers.CharField(required=False, allow_blank=True)
+    quantity = serializers.IntegerField(required=False, min_value=0)
 
-        return total_extra_price
+    def validate(self, attrs):
+        if attrs["op"] == "add" and attrs.get("quantity") is None:
+            raise ValidationError({"message": "A quantity is required to add a product.", "status": "failed"})
+        return attrs
 
 
-class DeleteCartItemSerializer(serializers.Serializer):
-    cart_id = serializers.CharField(max_length=60, required=True)
-    product_id = serializers.CharField(max_length=100, required=True)
+class CartBatchSerializer(serializers.Serializer):
+    cart_id = serializers.CharField(max_length=60, required=False, default=None, allow_blank=True)
+    operations = serializers.ListField(
+            child=CartOperationSerializer(), min_length=1, max_length=settings.CART_BATCH_MAX_OPERATIONS
+    )
 
     def save(self, **kwargs):
-        customer = self.context["request"].user
-        try:
-            cart = Order.objects.get(id=self.validated_data["cart_id"], customer=customer)
-            product = Product.objects.get(id=self.validated_data.get("product_id"))
-            item = OrderItem.objects.get(order=cart, product=product)
-        except (Order.DoesNotExist, Product.DoesNotExist, OrderItem.DoesNotExist):
-            raise ValidationError(
-                    {
-                        "message": "Invalid cart or product ID. Please check the provided IDs.",
-                        "status": "failed",
-                    }
-            )
-        item.delete()
+        batch = CartBatch(self.context["request"].user, self.validated_data.get("cart_id"))
+        items = batch.apply(self.validated_data["operations"])
+        return batch.cart, items
 
 
 class OrderSerializer(serializers.Serializer):
@@ -398,14 +294,17 @@ class OrderSerializer(serializers.Serializer):
             {
                 "customer": item.customer.full_name,
                 "title": item.product.title,
-                "price": item.product.price,
-                "shipping_fee": item.product.shipping_fee,
+                # The prices the line was ordered at, not the product's current ones
+                "price": item.unit_price,
+                "discount_price": item.discount_price,
+                "shipping_fee": item.shipping_fee,
+                "line_total": item.total_price,
                 "shipping_out_date": (obj.placed_at + timedelta(days=item.product.shipped_out_days)),
                 "quantity": item.quantity,
                 "size": item.size,
                 "colour": item.colour
             }
-            for item in obj.order_items.all()
+            for item in obj.order_items.select_related(None).select_related("product", "customer").with_totals()
         ]
 
 
@@ -422,49 +321,32 @@ class OrderListSerializer(serializers.Serializer):
 
     @staticmethod
     def get_items_count(obj: Order):
-        return f"{obj.order_items.count()} item(s) ordered"
+        return f"{obj.items_count} item(s) ordered"
 
 
 class CheckoutSerializer(serializers.Serializer):
+    cart_id = serializers.CharField(max_length=60, required=False, allow_blank=True)
     coupon_code = serializers.CharField(max_length=10, required=False, allow_blank=True)
 
     def save(self, **kwargs):
         customer = self.context["request"].user
-        coupon_discount = 0
-
-        with transaction.atomic():
-            try:
-                order = Order.objects.select_for_update().filter(customer=customer).first()
-            except Order.DoesNotExist:
-                raise ValidationError({"message": "Cart not found", "status": "failed"})
-
-            if self.validated_data.get("coupon_code"):
-                try:
-                    coupon = CouponCode.objects.get(
-                            code=self.validated_data["coupon_code"], expired=False
-                    )
-                    coupon_discount = coupon.price
-                    coupon.expired = True
-                    coupon.save()
-                except CouponCode.DoesNotExist:
-                    raise ValidationError(
-                            {"message": "Invalid coupon code", "status": "failed"}
-                    )
-
-            transaction_ref = uuid.uuid4().hex[:10]
-            if order.transaction_ref:
-                raise ValidationError(
-                        {"message": "Order has already been checked out. Make a different order", "status": "failed"})
+        cart_id = self.validated_data.get("cart_id")
+        backend = get_cart_backend()
 
-            order.transaction_ref = f"TR-{transaction_ref}"
-            order.all_total_price - coupon_discount
-            order.save()
+        # The customer's last changed cart unless one is given
+        cart = get_customer_cart(customer, cart_id, backend) if cart_id else backend.get_latest(customer)
+        if cart is None:
+            raise ValidationError({"message": "Cart not found", "status": "failed"})
 
-        return order
+        transaction_ref = uuid.uuid4().hex[:10]
+        # The order and its items are only written now, at the prices of checkout time, with the coupon redeemed
+        order = checkout_cart(cart, f"TR-{transaction_ref}", backend, self.validated_data.get("coupon_code"))
+
+        return Order.objects.with_totals().get(pk=order.pk)
 
     def to_representation(self, instance: Order):
         items = instance.order_items.values_list(
-                "id", "product__id", "product__title", "quantity", "product__shipping_fee", "product__shipped_out_days"
+                "id", "product__id", "product__title", "quantity", "shipping_fee", "product__shipped_out_days"
         )
         return {
             "id": instance.id,
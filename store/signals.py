@@ -0,0 +1,165 @@
+from collections import Counter, defaultdict
+
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from common.images import image_urls_updated, register_image_derivatives
+from store.choices import RATING_CHOICES
+from store.facets import invalidate_product_facets
+from store.feeds import invalidate_home_feed
+from store.flash_sales import flash_sales_changed, reset_schedule
+from store.models import Category, Colour, ColourInventory, Product, ProductImage, ProductReview, ProductReviewImage, \
+    Size, SizeInventory, SliderImage, rating_count_field
+from store.related import invalidate_related_products, rebuild_related_products
+from store.search import SEARCH_FIELDS, get_search_backend
+from store.taxonomy import invalidate_category_taxonomy
+
+register_image_derivatives(ProductImage, "_image")
+register_image_derivatives(ProductReviewImage, "_image")
+register_image_derivatives(SliderImage, "_image")
+
+RATING_FIELDS = ("rating_count", "rating_sum", *(rating_count_field(stars) for stars, _ in RATING_CHOICES))
+
+
+@receiver(post_save, sender=Product)
+def handle_product_search_indexing(sender, instance, using, update_fields=None, **kwargs):
+    if update_fields is not None and not set(update_fields) & set(SEARCH_FIELDS):
+        return
+    get_search_backend(using).index_products([instance.pk], using=using)
+
+
+@receiver(post_save, sender=Product)
+def handle_product_flash_sale_schedule(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not {"flash_sale_start_date", "flash_sale_end_date"} & set(update_fields):
+        return
+    # The next boundary is recomputed on the next sync
+    reset_schedule()
+
+
+@receiver(pre_save, sender=Product)
+def handle_product_previous_category(sender, instance, using, **kwargs):
+    instance._previous_category_id = None
+    if not instance._state.adding:
+        instance._previous_category_id = Product._base_manager.using(using).filter(pk=instance.pk) \
+            .values_list("category_id", flat=True).first()
+
+
+@receiver(post_save, sender=Product)
+def handle_product_related_products(sender, instance, using, update_fields=None, **kwargs):
+    if update_fields is not None and not {"category", "inventory"} & set(update_fields):
+        # Same ranking, only the cached payload is stale
+        invalidate_related_products(instance.category_id)
+        return
+    rebuild_related_products([instance.category_id, instance._previous_category_id], using)
+
+
+@receiver(post_delete, sender=Product)
+def handle_product_related_products_removal(sender, instance, using, **kwargs):
+    rebuild_related_products([instance.category_id], using)
+
+
+@receiver(post_save, sender=Category)
+def handle_category_related_products(sender, instance, **kwargs):
+    # The category title is part of every product payload
+    invalidate_related_products(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def handle_category_taxonomy(sender, **kwargs):
+    invalidate_category_taxonomy()
+
+
+@receiver(pre_delete, sender=Product)
+def handle_product_search_removal(sender, instance, using, **kwargs):
+    get_search_backend(using).remove_products([instance.pk], using=using)
+
+
+def update_product_ratings(review, previous_rating, current_rating, using):
+    # Ratings are (product_id, ratings) pairs, both sides are applied in one UPDATE per product
+    deltas = defaultdict(Counter)
+    for rating, sign in ((previous_rating, -1), (current_rating, 1)):
+        if rating is None:
+            continue
+        product_id, ratings = rating
+        delta = deltas[product_id]
+        if ratings is not None:
+            delta["rating_count"] += sign
+            delta["rating_sum"] += sign * ratings
+            delta[rating_count_field(ratings)] += sign
+
+    for product_id, delta in deltas.items():
+        # Reviews are part of the product details, `updated` also moves when only the text changed
+        Product._base_manager.using(using).filter(pk=product_id).update(
+                updated=timezone.now(), **{field: F(field) + value for field, value in delta.items() if value}
+        )
+
+    # Keep an already loaded product in line with the database
+    if deltas and ProductReview.product.is_cached(review):
+        review.product.refresh_from_db(fields=["updated", *RATING_FIELDS])
+
+
+@receiver(pre_save, sender=ProductReview)
+def handle_product_review_previous_rating(sender, instance, using, **kwargs):
+    instance._previous_rating = None
+    if not instance._state.adding:
+        instance._previous_rating = ProductReview.objects.using(using).filter(pk=instance.pk) \
+            .values_list("product_id", "ratings").first()
+
+
+@receiver(post_save, sender=ProductReview)
+def handle_product_review_rating(sender, instance, using, **kwargs):
+    update_product_ratings(instance, instance._previous_rating, (instance.product_id, instance.ratings), using)
+
+
+@receiver(post_delete, sender=ProductReview)
+def handle_product_review_deletion(sender, instance, using, **kwargs):
+    update_product_ratings(instance, (instance.product_id, instance.ratings), None, using)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(image_urls_updated, sender=ProductImage)
+@receiver(post_save, sender=SizeInventory)
+@receiver(post_delete, sender=SizeInventory)
+@receiver(post_save, sender=ColourInventory)
+@receiver(post_delete, sender=ColourInventory)
+@receiver(flash_sales_changed)
+def handle_home_feed_invalidation(sender, using, **kwargs):
+    invalidate_home_feed(using)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=SizeInventory)
+@receiver(post_delete, sender=SizeInventory)
+@receiver(post_save, sender=ColourInventory)
+@receiver(post_delete, sender=ColourInventory)
+@receiver(post_save, sender=Size)
+@receiver(post_save, sender=Colour)
+def handle_product_facets_invalidation(sender, **kwargs):
+    invalidate_product_facets()
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(image_urls_updated, sender=ProductImage)
+@receiver(post_save, sender=SizeInventory)
+@receiver(post_delete, sender=SizeInventory)
+@receiver(post_save, sender=ColourInventory)
+@receiver(post_delete, sender=ColourInventory)
+def handle_product_variant_change(sender, instance, using, **kwargs):
+    # Images and inventories are serialized with their product, they count as a change of the product for its ETag
+    Product._base_manager.using(using).filter(pk=instance.product_id).update(updated=timezone.now())
+    category_id = Product._base_manager.using(using).filter(pk=instance.product_id) \
+        .values_list("category_id", flat=True).first()
+    if category_id is not None:
+        invalidate_related_products(category_id)
@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from store.cache import bump_cache_version, get_cache_version, versioned_cache_key
+from store.choices import GENDER_FEMALE, GENDER_KIDS, GENDER_MALE
+from store.models import Category
+
+CATEGORY_TAXONOMY_NAMESPACE = "category_taxonomy"
+
+# Response keys of the categories of each gender, categories for everyone are only listed in `all_categories`
+GENDER_GROUPS = {
+    GENDER_MALE: "men_categories",
+    GENDER_FEMALE: "women_categories",
+    GENDER_KIDS: "kids_categories",
+}
+
+
+def build_category_taxonomy(using="default"):
+    taxonomy = {"all_categories": [], **{group: [] for group in GENDER_GROUPS.values()}}
+    for category in Category.objects.using(using).values("id", "title", "gender"):
+        item = {"id": category["id"], "title": category["title"]}
+        taxonomy["all_categories"].append(item)
+        if category["gender"] in GENDER_GROUPS:
+            taxonomy[GENDER_GROUPS[category["gender"]]].append(item)
+    return taxonomy
+
+
+def get_category_taxonomy():
+    """
+    All categories and the categories of each gender, loaded with one query and cached until a category changes.
+    """
+    key = versioned_cache_key(CATEGORY_TAXONOMY_NAMESPACE)
+    taxonomy = cache.get(key)
+    if taxonomy is None:
+        taxonomy = build_category_taxonomy()
+        cache.set(key, taxonomy, settings.CATEGORY_TAXONOMY_CACHE_TIMEOUT)
+    return taxonomy
+
+
+def get_category_taxonomy_version():
+    return get_cache_version(CATEGORY_TAXONOMY_NAMESPACE)
+
+
+def invalidate_category_taxonomy():
+    bump_cache_version(CATEGORY_TAXONOMY_NAMESPACE)
@@ -1,28 +1,53 @@
+import json
 import os
 import random
+import shutil
+import tempfile
+import uuid
 from datetime import timedelta
 from decimal import Decimal
-from unittest.mock import MagicMock
+from io import BytesIO, StringIO
+from unittest.mock import MagicMock, patch
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.hashers import check_password
+from django.core.cache import cache, caches
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse_lazy
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
 from rest_framework.response import Response
-from rest_framework.test import APIClient, APITestCase
+from rest_framework.test import APIClient, APIRequestFactory, APITestCase
 
+from common.images import update_image_urls
+from common.middleware import ReplicaReadMiddleware
+from common.parsers import ORJSONParser
+from common.renderers import ORJSONRenderer
+from common.routers import ReplicaRouter, allow_replica_reads, reset_replica_reads
 from core.models import Otp
+from store.carts import CartItemMutation, get_cart_backend
+from store.catalog import CatalogImporter
 from store.choices import GENDER_ALL, PAYMENT_COMPLETE, PAYMENT_FAILED, SHIPPING_STATUS_PENDING, \
     SHIPPING_STATUS_PROCESSING
-from store.models import Address, Category, Colour, ColourInventory, CouponCode, Notification, Order, Product, \
-    ProductImage, ProductReview, ProductReviewImage, Size, SizeInventory
-from store.serializers import AddProductReviewSerializer, OrderListSerializer, OrderSerializer, ProductDetailSerializer, \
-    ProductSerializer
-from store.views import FilteredProductListView
+from store.fast_serializers import product_list_serializer
+from store.feeds import get_home_feed
+from store.flash_sales import get_next_boundary, sync_flash_sales
+from store.models import Address, Category, Colour, ColourInventory, CouponCode, FavoriteProduct, Notification, Order, \
+    OrderItem, Product, ProductImage, ProductReview, ProductReviewImage, RelatedProducts, Size, SizeInventory
+from store.pagination import KeysetPagination
+from store.related import get_related_products
+from store.serializers import AddCartItemSerializer, AddProductReviewSerializer, CartBatchSerializer, \
+    OrderListSerializer, OrderSerializer, ProductDetailSerializer, ProductSerializer
+from store.views import CouponCodeView, FilteredProductListView
 
 
 class AuthenticationTestCase(APITestCase):
@@ -289,6 +314,9 @@ class AuthenticationTestCase(APITestCase):
         self.Category.delete()
         self.Product.delete()
         self.User.objects.all().delete()
+        # throttle history and carts live in the caches, start every test with a clean slate
+        cache.clear()
+        caches[settings.CART_CACHE_ALIAS].clear()
 
     def _register_user(self):
         response = self.client.post(reverse_lazy("register"), self.user_data, format="json")
@@ -378,6 +406,22 @@ class AuthenticationTestCase(APITestCase):
         self.assertEqual(data["message"], "All categories fetched")
         self.assertEqual(data['status'], "success")
 
+    def test_category_taxonomy(self):
+        self._authenticate_user()
+        men = Category.objects.create(title="Suits", gender="M")
+        with self.assertNumQueries(1):
+            data = self.client.get(reverse_lazy("category_list")).data
+        self.assertEqual(len(data["all_categories"]), Category.objects.count())
+        self.assertEqual(data["men_categories"], [{"id": men.id, "title": "Suits"}])
+        self.assertEqual([item["title"] for item in data["women_categories"]],
+                         list(Category.objects.filter(gender="F").values_list("title", flat=True)))
+
+        # Served from the cache until a category changes
+        with self.assertNumQueries(0):
+            self.client.get(reverse_lazy("category_list"))
+        men.delete()
+        self.assertEqual(self.client.get(reverse_lazy("category_list")).data["men_categories"], [])
+
     def test_get_categories_sales(self):
         self._authenticate_user()
         response = self.client.get(reverse_lazy("category_product_sales"))
@@ -507,6 +551,495 @@ class AuthenticationTestCase(APITestCase):
         serialized_data = FilteredProductListView.serializer_class([self.product], many=True).data
         self.assertEqual(response.data['data'], serialized_data)
 
+    def test_filtered_product_list_pagination(self):
+        self._authenticate_user()
+        url = reverse_lazy("products_search_and_filters")
+        response = self.client.get(url, {"page_size": 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['data']), 2)
+        self.assertIsNone(response.data['previous'])
+        first_page_ids = [product['id'] for product in response.data['data']]
+
+        # A product created while paging must not shift the next page
+        Product.objects.create(**{**self.product_data, "title": "Monitor"})
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['data']), 1)
+        self.assertIsNone(response.data['next'])
+        self.assertNotIn(response.data['data'][0]['id'], first_page_ids)
+
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([product['id'] for product in response.data['data']], first_page_ids)
+
+        response = self.client.get(url, {"cursor": "invalid"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_search_products(self):
+        self._authenticate_user()
+        url = reverse_lazy("products_search_and_filters")
+        Product.objects.create(**{**self.product_data, "title": "Laptop Stand", "description": "Keeps the keyboard up"})
+
+        response = self.client.get(url, {"search": "keyb"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Title matches rank above description matches
+        self.assertEqual([product['title'] for product in response.data['data']], ["Keyboard", "Laptop Stand"])
+
+        self.related_product1.title = "Wireless Keypad"
+        self.related_product1.save()
+        response = self.client.get(url, {"search": "keyb"})
+        self.assertEqual([product['title'] for product in response.data['data']], ["Laptop Stand"])
+
+        self.related_product1.delete()
+        response = self.client.get(url, {"search": "keyp"})
+        self.assertEqual(response.data['data'], [])
+
+    def test_product_queryset_projections(self):
+        with self.assertNumQueries(1):
+            Product.objects.exists_only().get(id=self.product.id)
+
+        # products with their category, then one query each for sizes, colours and images
+        with self.assertNumQueries(4):
+            ProductSerializer(Product.objects.for_listing(), many=True).data
+
+        with self.assertNumQueries(4):
+            ProductDetailSerializer(Product.objects.for_detail().get(id=self.product.id)).data
+
+    def test_product_rating_aggregates(self):
+        self._authenticate_user()
+        review = ProductReview.objects.create(product=self.product, customer=self.user, ratings=5, description='Great')
+        ProductReview.objects.create(product=self.product, customer=self.user, ratings=2, description='Meh')
+        self.assertEqual((self.product.rating_count, self.product.rating_sum), (2, 7))
+        self.assertEqual(self.product.average_ratings, 3.5)
+        self.assertEqual(self.product.ratings_histogram, {"1": 0, "2": 1, "3": 0, "4": 0, "5": 1})
+
+        review.ratings = 4
+        review.save()
+        review.delete()
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.rating_count, self.product.rating_sum), (1, 2))
+        self.assertEqual(self.product.ratings_histogram, {"1": 0, "2": 1, "3": 0, "4": 0, "5": 0})
+
+        Product.objects.filter(id=self.product.id).update(rating_count=0, rating_sum=0, rating_2_count=0)
+        call_command("rebuild_product_ratings", stdout=StringIO())
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.rating_count, self.product.rating_sum), (1, 2))
+        self.assertEqual(self.product.ratings_histogram, {"1": 0, "2": 1, "3": 0, "4": 0, "5": 0})
+
+    def test_product_reviews_list(self):
+        self._authenticate_user()
+        for ratings in (5, 4, 5, 1, 5):
+            ProductReview.objects.create(product=self.product, customer=self.user, ratings=ratings,
+                                         description=f'{ratings} stars')
+        url = reverse_lazy("product_reviews", kwargs={"product_id": self.product.id})
+
+        response = self.client.get(url, {"page_size": 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([review['ratings'] for review in response.data['data']], [5, 1, 5])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([review['ratings'] for review in response.data['data']], [4, 5])
+        self.assertIsNone(response.data['next'])
+
+        response = self.client.get(url, {"ratings": [4, 5]})
+        self.assertEqual([review['ratings'] for review in response.data['data']], [5, 5, 4, 5])
+
+        response = self.client.get(reverse_lazy("product_detail", kwargs={"product_id": self.product.id}))
+        self.assertEqual(response.data['data']['product_details']['ratings_histogram'],
+                         {"1": 1, "2": 0, "3": 0, "4": 1, "5": 3})
+
+    def test_product_facets(self):
+        self._authenticate_user()
+        url = reverse_lazy("product_facets")
+        with self.assertNumQueries(4):
+            facets = self.client.get(url).data["data"]
+        products = Product.objects.all()
+        self.assertEqual(facets["categories"], [
+            {"id": self.categories[0].id, "title": self.categories[0].title, "count": products.count()}
+        ])
+        self.assertEqual(facets["genders"], [{"value": "A", "label": "All", "count": products.count()}])
+        self.assertEqual(facets["locations"], [{"value": "US", "label": "United States of America",
+                                                "count": products.count()}])
+        self.assertEqual(sum(bucket["count"] for bucket in facets["price_ranges"]), products.count())
+        self.assertEqual({size["title"]: size["count"] for size in facets["sizes"]}, {"S": 1, "M": 1, "L": 1})
+        self.assertEqual([colour["name"] for colour in facets["colours"]], ["Blue", "Red"])
+
+        # Equivalent queries share the cached counts
+        self.client.get(url, {"search": "Laptop", "gender": "A"})
+        with self.assertNumQueries(0):
+            self.client.get(url, {"gender": "A", "search": "LAPTOP", "ordering": "created"})
+        self.assertEqual(self.client.get(url, {"gender": "F"}).data["data"]["categories"], [])
+
+        Product.objects.filter(pk=self.product.pk).update(inventory=0)
+        self.product.save()
+        self.assertEqual(self.client.get(url).data["data"]["categories"][0]["count"], products.count())
+
+    @override_settings(DATABASE_REPLICAS=["replica_0", "replica_1"])
+    def test_replica_routing(self):
+        router = ReplicaRouter()
+        # Every test runs in a transaction, which keeps reads on the primary
+        token = allow_replica_reads()
+        try:
+            self.assertEqual(router.db_for_read(Product), "default")
+        finally:
+            reset_replica_reads(token)
+
+        def route(view, method="get"):
+            # The alias the reads of a request to `view` go to
+            reads = []
+            request = getattr(APIRequestFactory(), method)("/")
+
+            def get_response(request):
+                middleware.process_view(request, view, (), {})
+                reads.append(router.db_for_read(Product))
+                reads.append(router.db_for_read(Category))
+                return reads
+
+            middleware = ReplicaReadMiddleware(get_response)
+            return middleware(request)
+
+        with patch("common.routers._in_transaction", return_value=False):
+            # Safe catalog reads go to the replica picked once for the request
+            with patch("common.routers.random.choice", side_effect=["replica_1"]):
+                self.assertEqual(route(FilteredProductListView.as_view()), ["replica_1", "replica_1"])
+            # Other views and methods stay on the primary
+            self.assertEqual(route(CouponCodeView.as_view()), ["default", "default"])
+            self.assertEqual(route(FilteredProductListView.as_view(), "post"), ["default", "default"])
+            self.assertEqual(router.db_for_read(Product), "default")
+
+            token = allow_replica_reads()
+            try:
+                self.assertIn(router.db_for_read(Product), settings.DATABASE_REPLICAS)
+                self.assertEqual(router.db_for_write(Notification), "default")
+                # Pinned to the primary once the request wrote
+                self.assertEqual(router.db_for_read(Product), "default")
+            finally:
+                reset_replica_reads(token)
+
+        # Only the primary is migrated
+        self.assertTrue(router.allow_migrate("default", "store"))
+        self.assertFalse(router.allow_migrate("replica_0", "store"))
+
+    def test_filter_and_order_by_effective_price(self):
+        self._authenticate_user()
+        url = reverse_lazy("products_search_and_filters")
+        self.assertEqual(self.product.effective_price, Decimal("17.99"))
+
+        self.related_product2.percentage_off = 50
+        self.related_product2.save(update_fields=["percentage_off"])
+        self.related_product2.refresh_from_db()
+        self.assertEqual(self.related_product2.effective_price, Decimal("20.00"))
+
+        # The list price of the mouse is out of range but customers pay 20.00 for it
+        response = self.client.get(url, {"effective_price_min": 15, "effective_price_max": 25, "ordering": "-effective_price"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([product['title'] for product in response.data['data']], ["Mouse", "Laptop"])
+
+        response = self.client.get(url, {"ordering": "effective_price", "page_size": 2})
+        self.assertEqual([product['title'] for product in response.data['data']], ["Laptop", "Mouse"])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([product['title'] for product in response.data['data']], ["Keyboard"])
+
+    def test_compiled_product_serializer(self):
+        ProductImage.objects.create(product=self.product, _image='store/product_images/laptop.png')
+        queryset = Product.objects.for_listing()
+        renderer = JSONRenderer()
+        self.assertEqual(renderer.render(product_list_serializer.serialize(queryset)),
+                         renderer.render(ProductSerializer(queryset, many=True).data))
+
+        with self.assertNumQueries(4):
+            product_list_serializer.serialize(queryset)
+
+        output = StringIO()
+        call_command("benchmark_product_serializers", sizes=[20], stdout=output)
+        self.assertIn("identical output: True", output.getvalue())
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_image_derivatives(self):
+        self.addCleanup(shutil.rmtree, settings.MEDIA_ROOT, ignore_errors=True)
+        with open(os.path.join(settings.BASE_DIR, "static", "pic1.jpeg"), "rb") as file:
+            upload = SimpleUploadedFile("pic1.jpeg", file.read(), content_type="image/jpeg")
+        with self.captureOnCommitCallbacks() as callbacks:
+            product_image = ProductImage.objects.create(product=self.product, _image=upload)
+        self.assertTrue(callbacks)
+        product_image.refresh_from_db()
+        self.assertEqual(list(product_image.image_urls), ["original"])
+
+        # Run in the foreground instead of the background thread
+        updated = Product.objects.values_list("updated", flat=True).get(pk=self.product.pk)
+        update_image_urls(ProductImage, product_image.pk)
+        product_image.refresh_from_db()
+        self.assertEqual(set(product_image.image_urls), {"original", "thumbnail", "medium", "large"})
+        # The product payloads show the image URLs, the product counts as changed
+        self.assertGreater(Product.objects.values_list("updated", flat=True).get(pk=self.product.pk), updated)
+        self.assertEqual(product_image.image, product_image.image_urls["original"])
+
+        ProductImage.objects.filter(pk=product_image.pk).update(image_urls={})
+        output = StringIO()
+        call_command("generate_image_derivatives", stdout=output, stderr=StringIO())
+        product_image.refresh_from_db()
+        self.assertIn("thumbnail", product_image.image_urls)
+
+        queryset = Product.objects.for_listing()
+        renderer = JSONRenderer()
+        self.assertEqual(renderer.render(product_list_serializer.serialize(queryset)),
+                         renderer.render(ProductSerializer(queryset, many=True).data))
+
+    def test_import_catalog(self):
+        category = self.categories[0].title
+        header = "title,category,description,style,price,inventory,percentage_off,location,sizes,colours,images\n"
+        rows = [
+            f"Monitor,{category},A monitor,Flat,100.00,5,10,US,S:3:1.50|M:2,Red:4,store/product_images/monitor.png\n",
+            f"{self.product.title},{category},Updated,Plain,50.00,7,0,US,S:9:0,,\n",
+            "Lamp,Unknown,A lamp,Plain,10.00,1,0,US,,,\n",
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "catalog.csv")
+            with open(path, "w") as file:
+                file.write(header + "".join(rows))
+            output, errors = StringIO(), StringIO()
+            call_command("import_catalog", path, batch_size=2, stdout=output, stderr=errors)
+        self.assertIn("1 products created, 1 updated, 1 rows skipped", output.getvalue())
+        self.assertIn("Line 4 skipped: Unknown category 'Unknown'", errors.getvalue())
+
+        monitor = Product.objects.get(title="Monitor")
+        self.assertEqual(monitor.effective_price, Decimal("90.00"))
+        self.assertEqual(sorted(monitor.size_inventory.values_list("size__title", "quantity", "extra_price")),
+                         [("M", 2, Decimal("0.00")), ("S", 3, Decimal("1.50"))])
+        self.assertEqual(monitor.color_inventory.get().colour.name, "Red")
+        self.assertEqual(monitor.images.get()._image.name, "store/product_images/monitor.png")
+        self.assertTrue(RelatedProducts.objects.filter(product=monitor).exists())
+
+        previous_update = self.product.updated
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.description, self.product.inventory), ("Updated", 7))
+        self.assertGreater(self.product.updated, previous_update)
+        self.assertIn(9, self.product.size_inventory.filter(size__title="S").values_list("quantity", flat=True))
+
+        # JSON lines rows update the existing variants instead of adding new ones
+        row = {"title": "Monitor", "category": category, "description": "A monitor", "style": "Flat", "price": 80.5,
+               "inventory": 5, "location": "US", "sizes": [{"size": "S", "quantity": 1}]}
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False) as file:
+            file.write(json.dumps(row) + "\n")
+        try:
+            call_command("import_catalog", file.name, stdout=StringIO(), stderr=StringIO())
+        finally:
+            os.remove(file.name)
+        self.assertEqual(monitor.size_inventory.count(), 2)
+        self.assertEqual(monitor.size_inventory.get(size__title="S").quantity, 1)
+        self.assertEqual(Product.objects.get(title="Monitor").effective_price, Decimal("80.50"))
+
+        # Rows that are not objects are skipped, a broken line stops the import after the batches before it
+        lines = [json.dumps({**row, "title": "Desk"}), json.dumps([1, 2]), "{broken"]
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False) as file:
+            file.write("\n".join(lines) + "\n")
+        try:
+            with self.assertRaisesMessage(CommandError, "Line 3 is not valid JSON"):
+                call_command("import_catalog", file.name, batch_size=1, stdout=StringIO(), stderr=StringIO())
+        finally:
+            os.remove(file.name)
+        # Caught up by `finish` for the products already written
+        self.assertTrue(RelatedProducts.objects.filter(product__title="Desk").exists())
+        importer = CatalogImporter()
+        importer.import_batch([(2, [1, 2])])
+        self.assertEqual(importer.errors, [(2, "Rows must be objects.")])
+
+    def test_export_catalog(self):
+        self._authenticate_user()
+        url = reverse_lazy("catalog_export")
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.login_response.is_staff = True
+        self.login_response.save()
+        self.client.force_authenticate(user=self.login_response)
+        self.assertEqual(self.client.get(url, {"file_format": "xml"}).status_code, status.HTTP_400_BAD_REQUEST)
+        Product.objects.filter(pk=self.related_product2.pk).update(inventory=0)
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+            self.assertTrue(response.streaming)
+            lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = {row["title"]: row for row in map(json.loads, lines)}
+        self.assertEqual(set(rows), {self.product.title, self.related_product1.title, self.related_product2.title})
+        row = rows[self.product.title]
+        self.assertEqual((row["price"], row["location"]), ("19.99", "US"))
+        self.assertEqual(len(row["sizes"]), self.product.size_inventory.count())
+        self.assertEqual(row["image_urls"], [image.urls for image in self.product.images.all()])
+
+        # CSV exports read back without changes
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "catalog.csv")
+            call_command("export_catalog", format="csv", output=path)
+            output = StringIO()
+            call_command("import_catalog", path, stdout=output, stderr=StringIO())
+        self.assertIn("0 products created, 3 updated, 0 rows skipped", output.getvalue())
+        self.assertEqual(self.product.size_inventory.count(), len(row["sizes"]))
+        self.assertEqual(self.product.images.count(), len(row["images"]))
+
+    def test_time_ordered_primary_keys(self):
+        notifications = [Notification.objects.create(notification_type="F", title=f"Notification {i}",
+                                                     description="Description") for i in range(5)]
+        self.assertTrue(all(notification.id.version == 7 for notification in notifications))
+        self.assertEqual(list(Notification.objects.order_by("id")), notifications)
+
+        # With time-ordered ids the id alone is enough for a cursor
+        paginator = KeysetPagination()
+        paginator.ordering, paginator.page_size = ("-id",), 2
+        request = Request(APIRequestFactory().get("/"))
+        self.assertEqual(paginator.paginate_queryset(Notification.objects.order_by(), request), notifications[:2:-1])
+        self.assertEqual(paginator.ordering, ("-id",))
+        next_request = Request(APIRequestFactory().get(paginator.get_next_link()))
+        self.assertEqual(paginator.paginate_queryset(Notification.objects.order_by(), next_request),
+                         notifications[2:0:-1])
+
+        output = StringIO()
+        call_command("benchmark_uuid_inserts", count=20, batch_size=10, stdout=output)
+        self.assertIn("uuid7: 20 rows", output.getvalue())
+        self.assertEqual(Notification.objects.count(), 5)
+
+    def test_hot_queries_are_index_served(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("The plans are checked in SQLite's EXPLAIN QUERY PLAN format")
+        customer_id, order_id, product_id = uuid.uuid4(), uuid.uuid4(), self.product.id
+        hot_queries = {
+            "store_order_customer_idx": Order.objects.filter(customer_id=customer_id),
+            "store_orderitem_order_idx": OrderItem.objects.filter(order_id=order_id),
+            "store_address_customer_idx": Address.objects.filter(customer_id=customer_id),
+            "store_fav_customer_idx": FavoriteProduct.objects.filter(customer_id=customer_id),
+            "store_review_product_idx": ProductReview.objects.filter(product_id=product_id).order_by("-created", "-id"),
+            "store_review_rating_idx": ProductReview.objects.filter(product_id=product_id, ratings=5)
+            .order_by("-created", "-id"),
+            "store_notif_created_idx": Notification.objects.all(),
+            "core_otp_user_idx": Otp.objects.filter(user_id=customer_id),
+        }
+        for index, queryset in hot_queries.items():
+            with self.subTest(index=index):
+                plan = queryset.explain()
+                self.assertIn(f"USING INDEX {index}", plan)
+                # The index order is the requested order, no sort step
+                self.assertNotIn("TEMP B-TREE FOR ORDER BY", plan)
+
+    def test_orjson_renderer_and_parser(self):
+        data = {"id": self.product.id, "price": Decimal("17.99"), "shipping_fee": Decimal("5.00"),
+                "created": self.product.created, "location": self.product.location, "note": "line\u2028break",
+                "sizes": Size.objects.values("title"),
+                "sold_at": timezone.now().replace(microsecond=123456), "ships_on": timezone.now().date()}
+        expected = JSONRenderer().render({**data, "location": "US"})
+        self.assertEqual(ORJSONRenderer().render(data), expected)
+        self.assertEqual(ORJSONParser().parse(BytesIO(expected))["price"], 17.99)
+
+        self._authenticate_user()
+        response = self.client.get(reverse_lazy("products_search_and_filters"))
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+        output = StringIO()
+        call_command("benchmark_json_renderers", count=10, repeat=1, stdout=output)
+        self.assertEqual(output.getvalue().count("identical output: True"), 2)
+
+    def test_conditional_get(self):
+        self._authenticate_user()
+        url = reverse_lazy("product_detail", kwargs={"product_id": self.product.id})
+        response = self.client.get(url)
+        etag = response['ETag']
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # A new variant changes the product payload
+        SizeInventory.objects.create(product=self.product, size=self.sizes[2], quantity=5, extra_price=0)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+        url = reverse_lazy("products_search_and_filters")
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertNotEqual(self.client.get(url, {"page_size": 1})['ETag'], etag)
+
+        url = reverse_lazy("category_list")
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        Category.objects.create(title="Shoes", gender="M")
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_related_products(self):
+        self.assertEqual(RelatedProducts.objects.get(product=self.product).related_ids,
+                         [str(self.related_product2.id), str(self.related_product1.id)])
+
+        get_related_products(self.product)
+        with self.assertNumQueries(1):
+            related = get_related_products(self.product)
+        self.assertEqual([item['id'] for item in related],
+                         [str(self.related_product2.id), str(self.related_product1.id)])
+
+        # A save that leaves the ranking as it was rewrites no list
+        with CaptureQueriesContext(connection) as queries:
+            self.product.save()
+        self.assertFalse([query for query in queries.captured_queries
+                          if query["sql"].startswith('INSERT INTO "store_relatedproducts"')])
+
+        # Products without a list yet get the category ranking, without writing it on a read
+        RelatedProducts.objects.filter(product=self.product).delete()
+        self.assertEqual([item['id'] for item in get_related_products(self.product)],
+                         [str(self.related_product2.id), str(self.related_product1.id)])
+        self.assertFalse(RelatedProducts.objects.filter(product=self.product).exists())
+        self.product.save()
+
+        # Moving a product out of the category updates the lists on both sides
+        self.related_product2.category = self.categories[1]
+        self.related_product2.save()
+        self.assertEqual(RelatedProducts.objects.get(product=self.product).related_ids, [str(self.related_product1.id)])
+        self.assertEqual(RelatedProducts.objects.get(product=self.related_product2).related_ids, [])
+
+        # Payloads follow product changes
+        self.related_product1.title = "Wireless Keyboard"
+        self.related_product1.save(update_fields=["title"])
+        self.assertEqual([item['title'] for item in get_related_products(self.product)], ["Wireless Keyboard"])
+
+        RelatedProducts.objects.all().delete()
+        call_command("rebuild_related_products", stdout=StringIO())
+        self.assertEqual(RelatedProducts.objects.count(), 3)
+
+    def test_home_feed_cache(self):
+        self._authenticate_user()
+        url = reverse_lazy("category_product_sales")
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], "application/json")
+        self.assertEqual(len(response.data['data']['product_without_flash_sales']), 3)
+
+        # Served from the cache
+        with self.assertNumQueries(0):
+            get_home_feed()
+
+        self.product.flash_sale_start_date = timezone.now() - timedelta(hours=1)
+        self.product.flash_sale_end_date = timezone.now() + timedelta(hours=1)
+        self.product.save()
+        data = self.client.get(url).data['data']
+        self.assertEqual(len(data['product_without_flash_sales']), 2)
+        self.assertEqual([product['title'] for product in data['products_with_flash_sales']], [self.product.title])
+
+        # Cached only until the flash sale ends
+        self.assertEqual(get_next_boundary(), self.product.flash_sale_end_date)
+
+    def test_flash_sale_scheduler(self):
+        now = timezone.now()
+        Product.objects.filter(id=self.product.id).update(
+                flash_sale_start_date=now + timedelta(hours=1), flash_sale_end_date=now + timedelta(hours=2)
+        )
+        self.assertEqual(sync_flash_sales(now), (0, 0))
+        self.assertEqual(get_next_boundary(), now + timedelta(hours=1))
+
+        self.assertEqual(sync_flash_sales(now + timedelta(hours=1)), (1, 0))
+        self.assertTrue(Product.objects.get(id=self.product.id).is_on_flash_sale)
+        self.assertEqual(get_next_boundary(), now + timedelta(hours=2))
+
+        # A sale ending now is over, it is not scheduled again
+        self.assertEqual(sync_flash_sales(now + timedelta(hours=2)), (0, 1))
+        self.assertIsNone(get_next_boundary())
+        self.assertEqual(sync_flash_sales(now + timedelta(hours=3)), (0, 0))
+        self.assertFalse(Product.objects.get(id=self.product.id).is_on_flash_sale)
+        self.assertIsNone(get_next_boundary())
+
     def test_create_product_review(self):
         self._authenticate_user()
         url = reverse_lazy('add_product_review')
@@ -636,6 +1169,175 @@ class AuthenticationTestCase(APITestCase):
         self.assertEqual(response.data['status'], 'success')
         self.assertEqual(response.data['message'], 'Item deleted successfully.')
 
+    def test_cart_item_mutation(self):
+        self._register_user()
+        request = MagicMock(user=self.user)
+        data = {"product_id": str(self.product.id), "size": "M", "colour": "Red", "quantity": 2}
+
+        # Product and variants in one query plus the images, the cart itself is kept by the cart backend
+        serializer = AddCartItemSerializer(data=data, context={"request": request})
+        with self.assertNumQueries(2):
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+        with self.assertNumQueries(0):
+            item = serializer.save()
+        self.assertEqual(item.extra_price, Decimal("4.98"))
+
+        data.update(cart_id=str(item.order_id), quantity=3)
+        serializer = AddCartItemSerializer(data=data, context={"request": request})
+        with self.assertNumQueries(2):
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+            serializer.save()
+        cart = get_cart_backend().get(item.order_id)
+        self.assertEqual([line["quantity"] for line in cart.lines.values()], [3])
+        self.assertFalse(Order.objects.filter(customer=self.user).exists())
+
+        serializer = AddCartItemSerializer(data={**data, "colour": "Green"}, context={"request": request})
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(serializer.errors["message"][0], "Colour not found for the given product.")
+
+        # Quantities below one are refused before they reach the cart
+        for quantity in (0, -1):
+            serializer = AddCartItemSerializer(data={**data, "quantity": quantity}, context={"request": request})
+            self.assertFalse(serializer.is_valid())
+            self.assertIn("quantity", serializer.errors)
+
+    def test_concurrent_cart_mutations(self):
+        self._register_user()
+        request = MagicMock(user=self.user)
+        item = AddCartItemSerializer(data={"product_id": str(self.product.id), "quantity": 1},
+                                     context={"request": request})
+        item.is_valid(raise_exception=True)
+        cart_id = str(item.save().order_id)
+
+        # Both requests read the cart before either writes it back
+        first, second = [
+            AddCartItemSerializer(data={"cart_id": cart_id, "product_id": str(product.id), "quantity": 2},
+                                  context={"request": request})
+            for product in (self.related_product1, self.related_product2)
+        ]
+        first.is_valid(raise_exception=True)
+        second.is_valid(raise_exception=True)
+        first.save()
+        second.save()
+        cart = get_cart_backend().get(cart_id)
+        self.assertEqual(cart.product_ids(),
+                         {str(self.product.id), str(self.related_product1.id), str(self.related_product2.id)})
+
+        # A write waits for the lock of another one and gives up past `lock_wait`
+        backend = get_cart_backend()
+        backend.lock_wait = 0
+        mutation = CartItemMutation.load(self.user, self.product.id, cart_id=cart_id, backend=backend)
+        with backend.lock(cart.id):
+            with self.assertRaises(ValidationError):
+                mutation.apply(5)
+        mutation.apply(5)
+        self.assertEqual(backend.get(cart_id).get_product_line(self.product.id)["quantity"], 5)
+
+    def test_cart_items_batch(self):
+        self._authenticate_user()
+        operations = [
+            {"op": "add", "product_id": str(self.product.id), "size": "M", "colour": "Red", "quantity": 2},
+            {"op": "add", "product_id": str(self.related_product1.id), "quantity": 1},
+            {"op": "add", "product_id": str(self.related_product2.id), "quantity": 4},
+            {"op": "update", "product_id": str(self.product.id), "colour": "Blue", "quantity": 3},
+            {"op": "remove", "product_id": str(self.related_product2.id)},
+        ]
+        request = MagicMock(user=self.user)
+        serializer = CartBatchSerializer(data={"operations": operations}, context={"request": request})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        # Products, images, sizes and colours whatever the number of operations
+        with self.assertNumQueries(4):
+            cart, items = serializer.save()
+        lines = {item.product_id: item for item in items}
+        self.assertEqual(set(lines), {self.product.id, self.related_product1.id})
+        self.assertEqual((lines[self.product.id].colour, lines[self.product.id].quantity), ("Blue", 3))
+        self.assertEqual(lines[self.product.id].extra_price, Decimal("1.99"))
+
+        # A failed operation leaves the cart as it was
+        response = self.client.post(reverse_lazy("cart_items_batch"), {"cart_id": str(cart.id), "operations": [
+            {"op": "remove", "product_id": str(self.product.id)},
+            {"op": "add", "product_id": str(self.related_product1.id), "size": "XL", "quantity": 1},
+        ]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["operation"], 1)
+        self.assertEqual(len(get_cart_backend().get(cart.id).lines), 2)
+
+        response = self.client.post(reverse_lazy("cart_items_batch"), {"cart_id": str(cart.id), "operations": [
+            {"op": "remove", "product_id": str(self.product.id)},
+        ]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["data"]), 1)
+        self.assertEqual(response.data["cart_total"], lines[self.related_product1.id].total_price)
+
+        # Lines whose product sold out are reported, checkout refuses them until they are removed
+        self.client.post(reverse_lazy("cart_items_batch"), {"cart_id": str(cart.id), "operations": [
+            {"op": "add", "product_id": str(self.product.id), "quantity": 1},
+        ]}, format="json")
+        Product.objects.filter(pk=self.related_product1.pk).update(inventory=0)
+        response = self.client.get(reverse_lazy("list_cart_items", kwargs={"cart_id": str(cart.id)}))
+        self.assertEqual([item["product"]["id"] for item in response.data["data"]], [str(self.product.id)])
+        self.assertEqual(response.data["unavailable_product_ids"], [str(self.related_product1.id)])
+        response = self.client.post(reverse_lazy("checkout"), {"cart_id": str(cart.id)}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["unavailable_product_ids"], [str(self.related_product1.id)])
+
+        response = self.client.post(reverse_lazy("cart_items_batch"), {"cart_id": str(cart.id), "operations": [
+            {"op": "remove", "product_id": str(self.related_product1.id)},
+        ]}, format="json")
+        self.assertEqual(response.data["unavailable_product_ids"], [])
+        response = self.client.post(reverse_lazy("checkout"), {"cart_id": str(cart.id)}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_checkout_materializes_cart(self):
+        self.test_add_cart_item()
+        cart = get_cart_backend().get(self.cart_id)
+
+        response = self.client.post(reverse_lazy("checkout"), data={"cart_id": self.cart_id})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        order = Order.objects.with_totals().get(id=response.data["data"]["id"])
+        self.assertEqual(order.total_items, 2)
+        self.assertEqual(order.all_total_price, sum(line["line_total"] for line in cart.lines.values()))
+        self.assertIsNone(get_cart_backend().get(self.cart_id))
+
+        # A cart is only ordered once
+        response = self.client.post(reverse_lazy("checkout"), data={"cart_id": self.cart_id})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Order.objects.filter(customer=self.user).count(), 1)
+
+    def test_order_totals(self):
+        self._register_user()
+        self.related_product1.percentage_off = 0
+        self.related_product1.save()
+        order = Order.objects.create(customer=self.user)
+        OrderItem.objects.create(customer=self.user, order=order, product=self.product, quantity=2,
+                                 extra_price=Decimal("1.99"))
+        OrderItem.objects.create(customer=self.user, order=order, product=self.related_product1, quantity=3,
+                                 extra_price=0)
+        items = OrderItem.objects.filter(order=order)
+        expected = {item.pk: item.total_price for item in items}
+
+        with self.assertNumQueries(1):
+            annotated = Order.objects.with_totals().get(pk=order.pk)
+            self.assertEqual(annotated.all_total_price, sum(expected.values()))
+            self.assertEqual(annotated.total_items, 5)
+            self.assertEqual(annotated.items_count, 2)
+        self.assertEqual(expected[items.get(product=self.product).pk], Decimal("45.95"))
+
+        # Lines keep the prices they were added with until checkout
+        self.product.price = 99
+        self.product.save()
+        self.assertEqual(Order.objects.with_totals().get(pk=order.pk).all_total_price, sum(expected.values()))
+        self.assertEqual(items.get(product=self.product).total_price, Decimal("45.95"))
+        annotated = Order.objects.with_totals().get(pk=order.pk)
+        # The lines with their products and customers in one query
+        with self.assertNumQueries(1):
+            lines = {line["title"]: line for line in OrderSerializer(annotated).data["items"]}
+        self.assertEqual((lines[self.product.title]["price"], lines[self.product.title]["line_total"]),
+                         (Decimal("19.99"), Decimal("45.95")))
+
+        empty = Order.objects.with_totals().get(pk=Order.objects.create(customer=self.user).pk)
+        self.assertEqual((empty.all_total_price, empty.total_items, empty.items_count), (0, 0, 0))
+
     def test_get_cart_items(self):
         self.test_add_cart_item()
 
@@ -690,11 +1392,26 @@ class AuthenticationTestCase(APITestCase):
 
         order = Order.objects.get(id=response.data["data"]["id"])
         self.assertIsNotNone(order.transaction_ref)
+        # The coupon price is taken off the total of the lines
+        lines_total = sum(item.total_price for item in order.order_items.all())
+        self.assertEqual(response.data["data"]["total_price"], max(lines_total - Decimal("20.45"), 0))
 
         coupon.refresh_from_db()  # fetch the latest data of th coupon model instance
         self.assertTrue(coupon.expired)
         self.order = order
 
+    def test_checkout_failure_keeps_cart(self):
+        self.test_add_cart_item()
+        # A used coupon fails the order after the cart was claimed, the cart is put back
+        coupon = CouponCode.objects.create(code="USEDCODE", price=5, expiry_date=timezone.now() + timedelta(days=1),
+                                           expired=True)
+        response = self.client.post(reverse_lazy("checkout"), data={"cart_id": self.cart_id,
+                                                                    "coupon_code": coupon.code})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["message"], "Invalid coupon code")
+        self.assertFalse(Order.objects.filter(customer=self.user).exists())
+        self.assertIsNotNone(get_cart_backend().get(self.cart_id))
+
     def test_add_checkout_order_address(self):
         self.test_checkout_with_coupon()
         address = Address.objects.create(customer=self.user, **self.address_data)
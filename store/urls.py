@@ -5,8 +5,10 @@ from store import views
 urlpatterns = [
     path("address/", views.AddressListCreateView.as_view(), name="address"),
     path("address/<str:address_id>/details/", views.AddressUpdateDeleteView.as_view(), name="address_details"),
+    path("cart/items/batch/", views.CartItemsBatchView.as_view(), name="cart_items_batch"),
     path("cart/items/<str:cart_id>/", views.CartItemsListView.as_view(), name="list_cart_items"),
     path("cart/items/", views.CartItemCreateUpdateDeleteView.as_view(), name="cart_items"),
+    path("catalog/export/", views.CatalogExportView.as_view(), name="catalog_export"),
     path("categories/all/", views.CategoryListView.as_view(), name="category_list"),
     path("categories/all-with-sales/", views.CategorySalesView.as_view(), name="category_product_sales"),
     path("checkout/", views.CheckoutView.as_view(), name="checkout"),
@@ -19,7 +21,9 @@ urlpatterns = [
     path("orders/", views.OrderListView.as_view(), name="list_order"),
     path("orders/<str:transaction_ref>/delete/", views.OrderDeleteView.as_view(), name="delete_order"),
     path("product-reviews/add/", views.ProductReviewCreateView.as_view(), name="add_product_review"),
+    path("products/facets/", views.ProductFacetsView.as_view(), name="product_facets"),
     path("products/search-filters/", views.FilteredProductListView.as_view(), name="products_search_and_filters"),
     path("products/<str:product_id>/details/", views.ProductDetailView.as_view(), name="product_detail"),
+    path("products/<str:product_id>/reviews/", views.ProductReviewListView.as_view(), name="product_reviews"),
     path("payments/<str:tx_ref>/verify/", views.VerifyPaymentView.as_view(), name="verify-payment")
 ]
@@ -1,28 +1,37 @@
 import requests
 from django.conf import settings
 from django.db.models import Q
-from django.http import Http404
-from django.utils import timezone
+from django.http import Http404, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_spectacular.utils import OpenApiParameter, OpenApiResponse, extend_schema
 from rest_framework import status
-from rest_framework.filters import SearchFilter
 from rest_framework.generics import GenericAPIView, ListAPIView
 from rest_framework.generics import get_object_or_404
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.throttling import UserRateThrottle
 
-from store.choices import GENDER_FEMALE, GENDER_KIDS, GENDER_MALE, PAYMENT_COMPLETE, PAYMENT_FAILED, \
-    SHIPPING_STATUS_PROCESSING
-from store.filters import ProductFilter
+from common.responses import PreRenderedResponse
+from store.carts import CartOperationError, get_cart_items, get_customer_cart
+from store.catalog import CATALOG_CONTENT_TYPES, CATALOG_FORMATS, export_rows, render_catalog
+from store.choices import PAYMENT_COMPLETE, PAYMENT_FAILED, SHIPPING_STATUS_PROCESSING
+from store.etags import category_list_etag, product_detail_etag, product_list_etag
+from store.fast_serializers import product_list_serializer
+from store.facets import facets_cache_key, get_product_facets
+from store.feeds import get_home_feed
+from store.filters import ProductFilter, ProductReviewFilter, ProductSearchFilter
 from store.mixins import GetOrderByTransactionRefMixin
-from store.models import Address, Category, ColourInventory, CouponCode, FavoriteProduct, Notification, Order, Product, \
+from store.pagination import KeysetPagination
+from store.models import Address, ColourInventory, CouponCode, FavoriteProduct, Notification, Order, Product, \
     ProductReview, ProductReviewImage, SizeInventory
 from store.serializers import AddCartItemSerializer, AddCheckoutOrderAddressSerializer, AddProductReviewSerializer, \
-    AddressSerializer, CartItemSerializer, CheckoutSerializer, CreateAddressSerializer, DeleteCartItemSerializer, \
-    FavoriteProductSerializer, OrderListSerializer, OrderSerializer, ProductDetailSerializer, ProductReviewSerializer, \
-    ProductSerializer, UpdateCartItemSerializer
+    AddressSerializer, CartBatchSerializer, CartItemSerializer, CheckoutSerializer, CreateAddressSerializer, \
+    DeleteCartItemSerializer, FavoriteProductSerializer, OrderListSerializer, OrderSerializer, \
+    ProductDetailSerializer, ProductReviewSerializer, ProductSerializer, UpdateCartItemSerializer
+from store.related import get_related_products
+from store.taxonomy import get_category_taxonomy
 from store.throttle import AuthenticatedScopeRateThrottle
 
 
@@ -260,6 +269,55 @@ class CartItemCreateUpdateDeleteView(GenericAPIView):
             return super().get_serializer_class()
 
 
+class CartItemsBatchView(GenericAPIView):
+    permission_classes = [IsAuthenticated]
+    serializer_class = CartBatchSerializer
+    throttle_classes = [UserRateThrottle]
+
+    @extend_schema(
+            summary="Apply Cart Operations",
+            description=
+            """
+            Apply a list of cart operations in one request, to sync a restored cart or a "buy again" list.
+            The request should include the following data:
+            - `cart_id`: ID of the cart, a new cart is created if left blank.
+            - `operations`: List of operations applied in order, each one with:
+                - `op`: `add` to set the quantity of a product line, `update` to change the size, colour or
+                    quantity of the product's line and `remove` to remove it.
+                - `product_id`: ID of the product.
+                - `size`, `colour`: Size and colour of the product, if None, leave blank.
+                - `quantity`: Quantity of the product, required to add it.
+
+            Either every operation is applied or none, a failed one is reported with its index as `operation`.
+            If the operations are applied successfully, the response will include the whole cart:
+            - `cart_id`: ID of the cart.
+            - `cart_total`: Total price of the cart.
+            - `data`: The serialized representation of the cart items.
+            - `unavailable_product_ids`: Products of the cart that are no longer available, left out of `data` and
+                `cart_total`. They have to be removed before checkout.
+            """,
+            responses={
+                status.HTTP_200_OK: OpenApiResponse(
+                        description="Cart updated successfully",
+                        response=CartItemSerializer,
+                ),
+            }
+    )
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        try:
+            cart, cart_items = serializer.save()
+        except CartOperationError as error:
+            return Response({"message": error.detail["message"], "operation": error.operation, "status": "failed"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        cart_items_data = CartItemSerializer(cart_items, many=True, context={'request': request}).data
+        return Response({"message": "Cart updated successfully", "cart_id": cart.id,
+                         "cart_total": sum([item.total_price for item in cart_items]), "data": cart_items_data,
+                         "unavailable_product_ids": cart.unavailable_product_ids(cart_items),
+                         "status": "success"}, status=status.HTTP_200_OK)
+
+
 class CartItemsListView(GenericAPIView):
     permission_classes = [IsAuthenticated]
     throttle_classes = [UserRateThrottle]
@@ -269,6 +327,8 @@ class CartItemsListView(GenericAPIView):
             description=
             """
             This endpoint allows the authenticated user to retrieve the items in their cart.
+            Products that are no longer available are listed in `unavailable_product_ids` instead of `data` and
+            `cart_total`, checkout refuses the cart until they are removed.
             """,
             responses={
                 status.HTTP_200_OK: OpenApiResponse(
@@ -285,18 +345,58 @@ class CartItemsListView(GenericAPIView):
         cart_id = self.kwargs.get("cart_id")
         if not cart_id:
             return Response({"message": "Cart ID not provided."}, status=status.HTTP_400_BAD_REQUEST)
-        try:
-            cart = Order.objects.get(id=cart_id, customer=customer)
-        except Order.DoesNotExist:
+        cart = get_customer_cart(customer, cart_id)
+        if cart is None:
             return Response({"message": "Cart not found", "status": "failed"},
                             status=status.HTTP_404_NOT_FOUND)
-        serializer = CartItemSerializer(cart.order_items.all(), many=True, context={'request': request})
-        return Response({"message": "Cart items retrieved successfully", "cart_total": cart.all_total_price,
-                         "data": serializer.data, "status": "success"}, status=status.HTTP_200_OK)
+        cart_items = get_cart_items(cart)
+        cart_total = sum([item.total_price for item in cart_items])
+        serializer = CartItemSerializer(cart_items, many=True, context={'request': request})
+        return Response({"message": "Cart items retrieved successfully", "cart_total": cart_total,
+                         "data": serializer.data, "unavailable_product_ids": cart.unavailable_product_ids(cart_items),
+                         "status": "success"}, status=status.HTTP_200_OK)
+
+
+class CatalogExportView(GenericAPIView):
+    permission_classes = [IsAdminUser]
+    throttle_classes = [AuthenticatedScopeRateThrottle]
+    throttle_scope = 'catalog_export'
+    # Products read from the database at once while streaming
+    chunk_size = 1000
+
+    @extend_schema(
+            summary="Export Catalog",
+            description=
+            """
+            Streams every product, sold out ones included, with its inventories, image paths and image URLs.
+            The file can be read back with the `import_catalog` command. Only available to staff users.
+            """,
+            parameters=[
+                OpenApiParameter(name="file_format", description="`jsonl` (default) or `csv`", required=False),
+            ],
+            responses={
+                status.HTTP_200_OK: OpenApiResponse(
+                        description="Catalog file",
+                ),
+                status.HTTP_400_BAD_REQUEST: OpenApiResponse(
+                        description="Unknown file format",
+                ),
+            }
+    )
+    def get(self, request):
+        catalog_format = request.query_params.get('file_format', 'jsonl')
+        if catalog_format not in CATALOG_FORMATS:
+            return Response({"message": f"Unknown file format, use one of {', '.join(CATALOG_FORMATS)}",
+                             "status": "failed"}, status=status.HTTP_400_BAD_REQUEST)
+        lines = render_catalog(export_rows(chunk_size=self.chunk_size), catalog_format)
+        response = StreamingHttpResponse(lines, content_type=CATALOG_CONTENT_TYPES[catalog_format])
+        response['Content-Disposition'] = f'attachment; filename="catalog.{catalog_format}"'
+        return response
 
 
 class CategoryListView(GenericAPIView):
     permission_classes = [IsAuthenticated]
+    read_from_replica = True
     throttle_classes = [AuthenticatedScopeRateThrottle]
     throttle_scope = 'category'
 
@@ -312,18 +412,15 @@ class CategoryListView(GenericAPIView):
                 ),
             }
     )
+    @method_decorator(condition(etag_func=category_list_etag))
     def get(self, request):
-        all_categories = Category.objects.values('id', 'title')
-        women_categories = Category.objects.filter(gender=GENDER_MALE).values('id', 'title')
-        men_categories = Category.objects.filter(gender=GENDER_FEMALE).values('id', 'title')
-        kids_categories = Category.objects.filter(gender=GENDER_KIDS).values('id', 'title')
-        return Response({"message": "All categories fetched", "all_categories": all_categories,
-                         "men_categories": men_categories, "women_categories": women_categories,
-                         "kids_categories": kids_categories, "status": "success"}, status=status.HTTP_200_OK)
+        return Response({"message": "All categories fetched", **get_category_taxonomy(), "status": "success"},
+                        status=status.HTTP_200_OK)
 
 
 class CategorySalesView(GenericAPIView):
     permission_classes = [IsAuthenticated]
+    read_from_replica = True
     serializer_class = ProductSerializer
     throttle_classes = [AuthenticatedScopeRateThrottle]
     throttle_scope = 'category'
@@ -342,22 +439,8 @@ class CategorySalesView(GenericAPIView):
             }
     )
     def get(self, request):
-        categories = Category.objects.values('id', 'title', )
-        products_without_flash_sales = Product.objects.filter(flash_sale_start_date=None, flash_sale_end_date=None)
-        product_with_flash_sales = Product.objects.filter(flash_sale_start_date__lte=timezone.now(),
-                                                          flash_sale_end_date__gte=timezone.now())
-        mega_sales = products_without_flash_sales.filter(percentage_off__gte=24)
-
-        serializer = self.serializer_class(many=True)
-
-        products_without_flash_sales_data = serializer.to_representation(products_without_flash_sales)
-        products_with_flash_sales_data = serializer.to_representation(product_with_flash_sales)
-        mega_sales_data = serializer.to_representation(mega_sales)
-
-        data = {'categories': categories, 'product_without_flash_sales': products_without_flash_sales_data,
-                'products_with_flash_sales': products_with_flash_sales_data, 'mega_sales': mega_sales_data}
-        return Response({"message": "Fetched all products", "data": data, "status": "success"},
-                        status=status.HTTP_200_OK)
+        # Pre-rendered JSON kept in the cache, see store.feeds
+        return PreRenderedResponse(get_home_feed(), status=status.HTTP_200_OK)
 
 
 class CheckoutView(GenericAPIView):
@@ -370,6 +453,8 @@ class CheckoutView(GenericAPIView):
             description=
             """
             This endpoint allows the authenticated user to create an order.
+            - `cart_id`: ID of the cart to order, the last changed cart of the customer if left blank.
+            - `coupon_code`: Coupon to apply to the order, optional.
             """,
             responses={
                 status.HTTP_201_CREATED: OpenApiResponse(
@@ -443,7 +528,7 @@ class FavoriteProductView(GenericAPIView):
             return Response({"message": "Product id is required", "status": "failed"},
                             status=status.HTTP_400_BAD_REQUEST)
         try:
-            product = Product.objects.get(id=product_id)
+            product = Product.objects.exists_only().get(id=product_id)
         except Product.DoesNotExist:
             return Response({"message": "Invalid product id", "status": "failed"}, status=status.HTTP_404_NOT_FOUND)
 
@@ -480,7 +565,7 @@ class FavoriteProductView(GenericAPIView):
             return Response({"message": "Product id is required", "status": "failed"},
                             status=status.HTTP_400_BAD_REQUEST)
         try:
-            product = Product.objects.get(id=product_id)
+            product = Product.objects.exists_only().get(id=product_id)
         except Product.DoesNotExist:
             return Response({"message": "Invalid product id", "status": "failed"}, status=status.HTTP_404_NOT_FOUND)
 
@@ -547,18 +632,21 @@ class FavoriteProductsListView(GenericAPIView):
 
 class FilteredProductListView(ListAPIView):
     permission_classes = [IsAuthenticated]
+    read_from_replica = True
     serializer_class = ProductSerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter]
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter]
     filterset_class = ProductFilter
-    search_fields = ['title', 'description']
-    queryset = Product.objects.all()
+    queryset = Product.objects.for_listing()
+    pagination_class = KeysetPagination
     throttle_classes = [UserRateThrottle]
 
     @extend_schema(
             summary="Filtered Product List",
             description=
             """
-            This endpoint retrieves a list of filtered products.
+            This endpoint retrieves a list of filtered products, newest first.
+            With `search`, products are full-text matched on title and description and ranked by relevance.
+            Results are paginated with an opaque `cursor`, follow the `next` and `previous` links to move between pages.
             """,
             responses={
                 status.HTTP_200_OK: OpenApiResponse(
@@ -570,11 +658,14 @@ class FilteredProductListView(ListAPIView):
                 ),
             },
     )
+    @method_decorator(condition(etag_func=product_list_etag))
     def get(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
-        serializer = self.serializer_class(queryset, many=True)
-        return Response({"message": "Products filtered successfully", "data": serializer.data, "status": "success"},
-                        status.HTTP_200_OK)
+        page = self.paginate_queryset(product_list_serializer.get_rows(queryset))
+        data = product_list_serializer.to_representation(page)
+        return Response({"message": "Products filtered successfully", "data": data,
+                         "next": self.paginator.get_next_link(), "previous": self.paginator.get_previous_link(),
+                         "status": "success"}, status.HTTP_200_OK)
 
 
 class NotificationListView(GenericAPIView):
@@ -645,7 +736,7 @@ class OrderListView(GetOrderByTransactionRefMixin, GenericAPIView):
                     status=status.HTTP_200_OK)
 
         else:
-            all_orders = Order.objects.filter(customer=customer)
+            all_orders = Order.objects.with_totals().filter(customer=customer)
             if not all_orders.exists():
                 return Response({"message": "Customer has no orders", "status": "success"}, status=status.HTTP_200_OK)
             serializer = OrderListSerializer(all_orders, many=True)
@@ -690,14 +781,17 @@ class OrderDeleteView(GetOrderByTransactionRefMixin, GenericAPIView):
 
 class ProductDetailView(GenericAPIView):
     permission_classes = [IsAuthenticated]
+    read_from_replica = True
     serializer_class = ProductDetailSerializer
     throttle_classes = [UserRateThrottle]
+    # Newest reviews embedded in the details
+    reviews_preview_size = 5
 
     @extend_schema(
             summary="Product Detail",
             description=
             """
-            Get the details of a specific product, along with related products and reviews.
+            Get the details of a specific product, along with related products, its ratings histogram and newest reviews.
             """,
             responses={
                 status.HTTP_200_OK: OpenApiResponse(
@@ -712,29 +806,59 @@ class ProductDetailView(GenericAPIView):
                 ),
             }
     )
+    @method_decorator(condition(etag_func=product_detail_etag))
     def get(self, request, *args, **kwargs):
         product_id = self.kwargs.get("product_id")
         if product_id is None:
             return Response({"message": "Product ID is required", "status": "success"},
                             status=status.HTTP_400_BAD_REQUEST)
         try:
-            product = Product.objects.get(id=product_id)
+            product = Product.objects.for_detail().get(id=product_id)
         except Product.DoesNotExist:
             return Response({"message": "This product does not exist, try again", "status": "failed"},
                             status=status.HTTP_404_NOT_FOUND)
-        related_products = product.category.products.exclude(id=product_id)[:10]
         product_serializer = self.get_serializer(product)
-        related_products_serializer = ProductSerializer(related_products, many=True)
-        product_reviews = product.product_reviews.select_related('customer')
+        # The rest of the reviews are paginated by ProductReviewListView
+        product_reviews = product.product_reviews.select_related(None).select_related('customer') \
+                              .order_by('-created', '-id')[:self.reviews_preview_size]
         product_review_serializer = ProductReviewSerializer(product_reviews, many=True)
         return Response({"message": "Product successfully fetched",
                          "data": {
                              "product_details": product_serializer.data,
-                             "related_products": related_products_serializer.data,
+                             "related_products": get_related_products(product),
                              "product_reviews": product_review_serializer.data
                          }, "status": "success"}, status=status.HTTP_200_OK)
 
 
+class ProductFacetsView(GenericAPIView):
+    permission_classes = [IsAuthenticated]
+    read_from_replica = True
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter]
+    filterset_class = ProductFilter
+    queryset = Product.objects.all()
+    throttle_classes = [UserRateThrottle]
+
+    @extend_schema(
+            summary="Product Facets",
+            description=
+            """
+            Counts the products matching the same filters and `search` as the filtered product list, per category,
+            gender, condition, location, size, colour and price range. Meant for building filter sidebars.
+            """,
+            responses={
+                status.HTTP_200_OK: OpenApiResponse(
+                        description="Product facets fetched",
+                ),
+            },
+    )
+    def get(self, request, *args, **kwargs):
+        # Lazy, the filters are validated here but only queried on a cache miss
+        queryset = self.filter_queryset(self.get_queryset())
+        facets = get_product_facets(queryset, facets_cache_key(request.query_params))
+        return Response({"message": "Product facets fetched", "data": facets, "status": "success"},
+                        status.HTTP_200_OK)
+
+
 class ProductReviewCreateView(GenericAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = AddProductReviewSerializer
@@ -760,7 +884,7 @@ class ProductReviewCreateView(GenericAPIView):
         serializer = self.serializer_class(data=request.data)
         serializer.is_valid(raise_exception=True)
         product_id = serializer.validated_data.get('product_id')
-        product = Product.objects.get(id=product_id)
+        product = Product.objects.exists_only().get(id=product_id)
         images = request.FILES.getlist('images')
         if len(images) > 3:
             return Response({"message": "The maximum number of allowed images is 3", "status": "failed"},
@@ -771,6 +895,49 @@ class ProductReviewCreateView(GenericAPIView):
         return Response({"message": "Review created successfully", "status": "success"}, status.HTTP_201_CREATED)
 
 
+class ProductReviewListView(ListAPIView):
+    permission_classes = [IsAuthenticated]
+    serializer_class = ProductReviewSerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = ProductReviewFilter
+    pagination_class = KeysetPagination
+    throttle_classes = [UserRateThrottle]
+
+    def get_queryset(self):
+        return ProductReview.objects.select_related(None).select_related('customer') \
+            .filter(product_id=self.kwargs.get("product_id"))
+
+    @extend_schema(
+            summary="Product Reviews",
+            description=
+            """
+            This endpoint retrieves the reviews of a product, newest first, optionally filtered by `ratings`.
+            Results are paginated with an opaque `cursor`, follow the `next` and `previous` links to move between pages.
+            """,
+            responses={
+                status.HTTP_200_OK: OpenApiResponse(
+                        description="Product reviews fetched.",
+                        response=ProductReviewSerializer(many=True)
+                ),
+                status.HTTP_404_NOT_FOUND: OpenApiResponse(
+                        description="This product does not exist, try again",
+                ),
+            },
+    )
+    def get(self, request, *args, **kwargs):
+        try:
+            Product.objects.exists_only().get(id=self.kwargs.get("product_id"))
+        except Product.DoesNotExist:
+            return Response({"message": "This product does not exist, try again", "status": "failed"},
+                            status=status.HTTP_404_NOT_FOUND)
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        serializer = self.serializer_class(page, many=True)
+        return Response({"message": "Product reviews fetched", "data": serializer.data,
+                         "next": self.paginator.get_next_link(), "previous": self.paginator.get_previous_link(),
+                         "status": "success"}, status.HTTP_200_OK)
+
+
 class VerifyPaymentView(GenericAPIView):
     permission_classes = [IsAuthenticated]
     throttle_classes = [AuthenticatedScopeRateThrottle]
@@ -811,7 +978,7 @@ class VerifyPaymentView(GenericAPIView):
         tx_ref = self.kwargs.get('tx_ref')
 
         try:
-            order = get_object_or_404(Order, customer=customer, transaction_ref=tx_ref)
+            order = get_object_or_404(Order.objects.with_totals(), customer=customer, transaction_ref=tx_ref)
         except Http404:
             return Response(
                     {"message": f"Customer does not have an order with this transaction reference {tx_ref}",